@@ -1,8 +1,160 @@
+import concurrent.futures
+import copy
+import csv
+import functools
+import hashlib
+import json
+import os
 import arcpy
-from arcpy.sa import Float
+import numpy as np
 import pandas as pd
 import math
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# numba is optional; without it the NDVI falls back to numexpr or NumPy, and
+#   the per-zone percentiles are a plain Python loop
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# numexpr is optional; it fuses the NDVI arithmetic into one multithreaded pass
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+# GDAL is optional; it is only needed for SmartRaster.calculate_ndvi_gdal
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+# rasterio is optional; it is only needed for calculate_ndvi(use_rasterio=True)
+try:
+    import rasterio
+    from rasterio.windows import Window
+except ImportError:
+    rasterio = None
+
+# rasterstats is optional; with it, the zonal statistics ArcGIS has no NumPy
+#   version of can be worked out without an intermediate table
+try:
+    import rasterstats
+except ImportError:
+    rasterstats = None
+
+
+# When this file was last changed, as of this import; the lab script checks
+#   it to decide whether the module needs reloading
+_mtime = os.path.getmtime(__file__)
+
+# Environment settings for the geoprocessing tools called in this module:
+#   nothing is added to the open map, tools that can run in parallel use
+#   every core, and no pyramids or statistics are built for the throwaway
+#   rasters in between
+ARCPY_TOOL_ENV = dict(addOutputsToMap=False, parallelProcessingFactor="100%",
+                      pyramid="NONE", rasterStatistics="NONE")
+
+
+# Quantized NDVI is stored as int16: NDVI = value * NDVI_INT16_SCALE
+NDVI_INT16_SCALE = 0.0001
+NDVI_INT16_NODATA = -32768
+
+# Default NDVI tiles are at least this many pixels a side (a whole number of
+#   the raster's own blocks), so a large scene is a few dozen tiles to
+#   mosaic rather than thousands of tiny ones, at ~4 MB per float32 band tile
+NDVI_TILE_SIZE = 1024
+
+# Working-set budget for one row strip of the NDVI (roughly a CPU's L3 cache)
+NDVI_CACHE_BYTES = 8 * 1024 * 1024
+
+# dataset_fingerprint hashes a block of at most this many pixels a side
+#   from the middle of a geodatabase raster
+FINGERPRINT_SAMPLE_SIZE = 256
+
+
+def dataset_fingerprint(path):
+    """
+    A short string that changes when the dataset at path changes, and
+    not when something else in the same workspace does (lock files,
+    other datasets being written), for deciding whether a saved result
+    made from it is still good.
+
+    A file on its own (a GeoTIFF, a shapefile and its .dbf) is identified
+    by its size and modification time.  A dataset inside a geodatabase
+    isn't a file, so it's identified by what arcpy reports about it:
+    a raster by its extent, size, bands and pixel type, plus a hash of
+    the pixels in a block from its middle; a table or
+    feature class by its row count, fields, extent, and (if editor
+    tracking is on) its latest edit date.  An edit in a geodatabase that
+    changes none of those, like changing one value in place without
+    editor tracking, isn't noticed; delete the saved result to force
+    it to be made again.
+    """
+    desc = arcpy.Describe(path)
+    catalog_path = desc.catalogPath
+    parts = [catalog_path]
+
+    if os.path.isfile(catalog_path):
+        # The file itself, plus the attribute and index files of a shapefile
+        base = os.path.splitext(catalog_path)[0]
+        for f in [catalog_path, base + ".dbf", base + ".shx"]:
+            if os.path.isfile(f):
+                stat = os.stat(f)
+                parts.append((f, stat.st_size, stat.st_mtime_ns))
+    elif desc.dataType in ("RasterDataset", "RasterBand", "MosaicDataset"):
+        raster = arcpy.Raster(catalog_path)
+        extent = raster.extent
+        parts.append((extent.XMin, extent.YMin, extent.XMax, extent.YMax,
+                      raster.width, raster.height, raster.bandCount, raster.pixelType))
+        # Another date's clip of the same scene has the same extent, size
+        #   and type, so also hash the pixels of a block in the middle
+        ncols = min(raster.width, FINGERPRINT_SAMPLE_SIZE)
+        nrows = min(raster.height, FINGERPRINT_SAMPLE_SIZE)
+        corner = arcpy.Point(extent.XMin + (raster.width - ncols) // 2 * raster.meanCellWidth,
+                             extent.YMin + (raster.height - nrows) // 2 * raster.meanCellHeight)
+        sample = arcpy.RasterToNumPyArray(raster, corner, ncols, nrows)
+        parts.append(hashlib.blake2b(np.ascontiguousarray(sample).tobytes(),
+                                     digest_size=8).hexdigest())
+    else:
+        extent = getattr(desc, "extent", None)
+        parts.append(int(arcpy.management.GetCount(catalog_path)[0]))
+        parts.append([(f.name, f.type, f.length) for f in arcpy.ListFields(catalog_path)])
+        if extent is not None:
+            parts.append((extent.XMin, extent.YMin, extent.XMax, extent.YMax))
+        if getattr(desc, "editorTrackingEnabled", False) and desc.editedAtFieldName:
+            edited = arcpy.da.TableToNumPyArray(catalog_path, [desc.editedAtFieldName],
+                                                skip_nulls=True)[desc.editedAtFieldName]
+            parts.append(str(edited.max()) if len(edited) else None)
+
+    return hashlib.blake2b(repr(parts).encode(), digest_size=8).hexdigest()
+
+
+def _tag_path(out_path):
+    """
+    Where to keep the ".tag" file recording what out_path was made from:
+    beside out_path if it's a file, or beside its geodatabase (named
+    "<gdb>_<name>.tag") if it's inside one, since the .gdb folder itself
+    belongs to ArcGIS.  A bare name is taken as relative to
+    arcpy.env.workspace, the same way the geoprocessing tools take it.
+    """
+    if not os.path.dirname(out_path) and arcpy.env.workspace:
+        out_path = os.path.join(arcpy.env.workspace, out_path)
+    workspace, name = os.path.split(os.path.abspath(out_path))
+    if os.path.splitext(workspace)[1].lower() in (".gdb", ".sde"):
+        gdb_dir, gdb_name = os.path.split(workspace)
+        return os.path.join(gdb_dir, f"{os.path.splitext(gdb_name)[0]}_{name}.tag")
+    return os.path.join(workspace, f"{name}.tag")
+
+
+def _group_blocks(block_width, block_height):
+    # The smallest whole number of blocks that is at least NDVI_TILE_SIZE
+    #   pixels a side, as an (x, y) tile size
+    return (block_width * math.ceil(NDVI_TILE_SIZE / block_width),
+            block_height * math.ceil(NDVI_TILE_SIZE / block_height))
 
 
 class SmartRaster(arcpy.Raster):
@@ -11,12 +163,35 @@ class SmartRaster(arcpy.Raster):
         # Initialize the SmartRaster object with the raster path
         super().__init__(raster_path)
         self.raster_path = raster_path
-        self.metadata = self._extract_metadata()  # Extract metadata for the raster
+        self._bands = {}  # Single-band Rasters opened so far, keyed on band number
+
+    # Metadata already worked out for any SmartRaster, keyed on catalog
+    #   path, so making another SmartRaster for the same raster doesn't
+    #   work it out again.  Nothing on disk says reliably when a raster in
+    #   a geodatabase has changed, so if a raster is overwritten during the
+    #   session, call SmartRaster.clear_meta_cache() before looking again
+    _meta_cache = {}
+
+    @classmethod
+    def clear_meta_cache(cls, catalog_path=None):
+        """Forget the cached metadata for one raster (by catalog path), or for all of them."""
+        if catalog_path is None:
+            cls._meta_cache.clear()
+        else:
+            cls._meta_cache.pop(catalog_path, None)
 
-    def _extract_metadata(self):
-        # Extract metadata such as bounds, dimensions, and pixel type
-        desc = arcpy.Describe(self.raster_path)
-        extent = desc.extent
+    @functools.cached_property
+    def metadata(self):
+        # Metadata such as bounds, dimensions, and pixel type.  It is only
+        #   worked out the first time it's asked for, and everything comes
+        #   from the Raster itself, so there's no need for arcpy.Describe
+        #   Each SmartRaster gets its own deep copy, so changing its bounds
+        #   list doesn't change the cached one every other SmartRaster sees
+        key = self.catalogPath
+        if key in SmartRaster._meta_cache:
+            return copy.deepcopy(SmartRaster._meta_cache[key])
+
+        extent = self.extent
 
         # Define raster bounds using extent
         bounds = [[extent.XMin, extent.YMax],
@@ -29,18 +204,106 @@ class SmartRaster(arcpy.Raster):
         pixelType = self.pixelType
 
         # Return metadata as a dictionary
-        return {
+        metadata = {
             "bounds": bounds,
             "x_dim": x_dim,
             "y_dim": y_dim,
             "n_bands": n_bands,
             "pixelType": pixelType
         }
+        SmartRaster._meta_cache[key] = metadata
+        return copy.deepcopy(metadata)
+
+    def _band_path(self, band_index):
+        # Full path to a single band of the raster.  It's built from the
+        #   catalog path rather than the name the raster was opened with,
+        #   since that may only make sense relative to arcpy.env.workspace,
+        #   which worker processes don't inherit
+        return f"{self.catalogPath}\\Band_{band_index}"
+
+    def _band(self, band_index):
+        # Open a band as a Raster the first time it's asked for, and reuse it after that
+        if band_index not in self._bands:
+            self._bands[band_index] = arcpy.Raster(self._band_path(band_index))
+        return self._bands[band_index]
 
-    def calculate_ndvi(self, band4_index=4, band3_index=3):
+    def _block_windows(self, block_size=None):
+        """
+        Split the raster into (xoff, yoff, xsize, ysize) pixel windows that
+        line up with the raster's native blocks, grouping several blocks
+        together into tiles of at least NDVI_TILE_SIZE pixels a side.
+        With block_size="strips", or if the raster doesn't report a block
+        size, use full-width strips of rows instead, sized so the NIR, Red
+        and NDVI strips all fit in NDVI_CACHE_BYTES.
+        """
+        # Use the raster's own block size if the caller did not set one
+        if block_size is None:
+            try:
+                info = self.getRasterInfo()
+                block_size = _group_blocks(info.getBlockWidth(), info.getBlockHeight())
+            except Exception:
+                block_size = "strips"
+        if block_size == "strips":
+            # Three float32 arrays (NIR, Red, NDVI) per strip
+            strip_rows = max(1, NDVI_CACHE_BYTES // (3 * self.width * 4))
+            block_size = (self.width, strip_rows)
+        elif isinstance(block_size, int):
+            block_size = (block_size, block_size)
+        bx, by = block_size
+
+        # Walk the raster top to bottom, left to right
+        windows = []
+        for yoff in range(0, self.height, by):
+            for xoff in range(0, self.width, bx):
+                windows.append((xoff, yoff,
+                                min(bx, self.width - xoff),
+                                min(by, self.height - yoff)))
+        return windows
+
+    def _window_lower_left(self, window):
+        # The lower left corner of a pixel window in map units (rows count down from the top)
+        xoff, yoff, xsize, ysize = window
+        return (self.extent.XMin + xoff * self.meanCellWidth,
+                self.extent.YMax - (yoff + ysize) * self.meanCellHeight)
+
+    def calculate_ndvi(self, band4_index=4, band3_index=3, window=None, block_size=None,
+                       n_workers=1, max_batch_size=64, quantize=False, use_rasterio=False):
         """
         Calculate NDVI using the NIR (band 4) and Red (band 3) bands.
         NDVI = (NIR - Red) / (NIR + Red)
+
+        The bands are read into NumPy arrays and the NDVI is computed in a
+        single fused pass, rather than through ArcPy map algebra (which
+        writes out a full intermediate raster for every operator).  Large
+        rasters are processed one block at a time, so only a block's worth
+        of pixels is ever held in memory, and the blocks are mosaicked
+        back together at the end.  The blocks are independent, so they can
+        be spread across several worker processes.
+
+        The NDVI is computed and stored as float32 rather than float64:
+        that halves the memory traffic, and float32's precision (~1e-7)
+        is still far finer than the sensor noise in an index in [-1, 1].
+        With quantize=True it is stored as 16-bit integers instead,
+        NDVI * 10000 (so multiply by NDVI_INT16_SCALE to get the NDVI
+        back), with NDVI_INT16_NODATA as NoData -- half the size again.
+
+        Parameters:
+        - band4_index, band3_index: band numbers of the NIR and Red bands
+        - window: optional (xoff, yoff, xsize, ysize) in pixels to only
+          compute the NDVI for part of the raster (default: whole raster)
+        - block_size: optional tile size in pixels, as an int or (x, y), or
+          "strips" for cache-sized strips of whole rows
+          (default: the smallest whole number of the raster's native blocks
+          that is at least NDVI_TILE_SIZE pixels a side)
+        - n_workers: number of worker processes to compute tiles in
+          (default: 1, i.e. compute everything in this process)
+        - max_batch_size: maximum number of tiles handed to the workers
+          at once, which bounds how many finished tiles sit in memory
+        - quantize: store the NDVI as scaled int16 rather than float32
+        - use_rasterio: read the tiles with rasterio on n_workers threads
+          instead of with arcpy.  GDAL lets go of the GIL while it reads,
+          so the threads overlap reading one tile with computing another.
+          The tiles follow the file's internal blocks (e.g. a COG's tiles).
         """
         # Initialize a tracker variable to indicate success or failure
         okay = True
@@ -48,45 +311,601 @@ class SmartRaster(arcpy.Raster):
         # Initialize the NDVI raster variable to None
         ndvi_raster = None
 
+        if use_rasterio and rasterio is None:
+            okay = False
+            return okay, "use_rasterio=True needs rasterio to be installed"
+
+        if use_rasterio and block_size is None:
+            # Line the tiles up with the blocks GDAL sees in the file, grouped
+            #   into tiles of at least NDVI_TILE_SIZE a side (a striped GeoTIFF's
+            #   blocks are single rows, far too small to be tiles on their own)
+            try:
+                with rasterio.open(self.catalogPath) as src:
+                    block_rows, block_cols = src.block_shapes[band4_index - 1]
+            except Exception as e:
+                # GDAL can't open every raster arcpy can (e.g. some geodatabase
+                #   rasters), and then it can't read the tiles either
+                okay = False
+                return okay, f"rasterio couldn't open {self.catalogPath}: {e}"
+            block_size = _group_blocks(block_cols, block_rows)
+
+        # Either the single window asked for, or the whole raster in blocks
+        if window is not None:
+            windows = [window]
+        else:
+            windows = self._block_windows(block_size)
+
+        # Full paths to the NIR (band 4) and Red (band 3) bands.  The workers
+        #   get the paths rather than Raster objects, which can't be pickled
+        nir_path = self._band_path(band4_index)
+        red_path = self._band_path(band3_index)
+
         try:
             # Load the NIR (band 4) raster using the provided band index
-            nir_band = arcpy.Raster(f"{self.raster_path}\\Band_{band4_index}") 
+            nir_band = self._band(band4_index)
 
             # Load the Red (band 3) raster using the provided band index
-            red_band = arcpy.Raster(f"{self.raster_path}\\Band_{band3_index}")
+            red_band = self._band(band3_index)
         except Exception as e:
             # If there is an error loading the bands, set tracker to False and return the error message
             okay = False
             return okay, f"Error retrieving bands: {e}"
 
         try:
-            # Calculate the numerator of the NDVI formula (NIR - Red)
-            numerator = Float(nir_band - red_band)
+            tiles = []
+            corners = [self._window_lower_left(w) for w in windows]
+            if use_rasterio:
+                # Read and compute the tiles on a pool of threads, one batch at a time
+                with concurrent.futures.ThreadPoolExecutor(max_workers=max(n_workers, 1)) as executor:
+                    for i in range(0, len(windows), max_batch_size):
+                        batch = windows[i:i + max_batch_size]
+                        batch_corners = corners[i:i + max_batch_size]
+                        results = executor.map(_ndvi_tile_rasterio,
+                                               [self.catalogPath] * len(batch),
+                                               [band4_index] * len(batch),
+                                               [band3_index] * len(batch),
+                                               batch,
+                                               [quantize] * len(batch))
+                        for (w, ndvi), corner in zip(results, batch_corners):
+                            tiles.append(self._ndvi_tile_to_raster(ndvi, corner))
+            elif n_workers > 1 and len(windows) > 1:
+                # Hand the tiles to the worker processes one batch at a time
+                with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
+                    for i in range(0, len(windows), max_batch_size):
+                        batch = windows[i:i + max_batch_size]
+                        batch_corners = corners[i:i + max_batch_size]
+                        results = executor.map(_ndvi_tile,
+                                               [nir_path] * len(batch),
+                                               [red_path] * len(batch),
+                                               batch,
+                                               batch_corners,
+                                               [quantize] * len(batch),
+                                               [False] * len(batch))
+                        for (w, ndvi), corner in zip(results, batch_corners):
+                            tiles.append(self._ndvi_tile_to_raster(ndvi, corner))
+            else:
+                # Compute the tiles one after another in this process
+                for w, corner in zip(windows, corners):
+                    w, ndvi = _ndvi_tile(nir_band, red_band, w, corner, quantize)
+                    tiles.append(self._ndvi_tile_to_raster(ndvi, corner))
+        except Exception as e:
+            # If there is an error during the NDVI calculation, set tracker to False and return the error message
+            okay = False
+            return okay, f"Error calculating NDVI: {e}"
 
-            # Calculate the denominator of the NDVI formula (NIR + Red)
-            denominator = Float(nir_band + red_band)
+        if len(tiles) == 1:
+            # Nothing to stitch together
+            ndvi_raster = tiles[0]
+            return okay, ndvi_raster
 
-            # Compute the NDVI by dividing the numerator by the denominator
-            ndvi_raster = numerator / denominator
+        try:
+            # Stitch the tiles back into a single raster in the scratch workspace,
+            #   under a new name each time so an NDVI returned by an earlier
+            #   call is never overwritten
+            mosaic_path = arcpy.CreateUniqueName("ndvi_mosaic", arcpy.env.scratchGDB)
+            mosaic_name = os.path.basename(mosaic_path)
+            with arcpy.EnvManager(outputCoordinateSystem=self.spatialReference, **ARCPY_TOOL_ENV):
+                arcpy.management.MosaicToNewRaster(tiles, arcpy.env.scratchGDB, mosaic_name,
+                                                   coordinate_system_for_the_raster=self.spatialReference,
+                                                   pixel_type="16_BIT_SIGNED" if quantize else "32_BIT_FLOAT",
+                                                   cellsize=self.meanCellWidth,
+                                                   number_of_bands=1)
+            ndvi_raster = arcpy.Raster(mosaic_path)
 
             # Return success and the resulting NDVI raster
             return okay, ndvi_raster
+        except Exception as e:
+            # If there is an error mosaicking the tiles, set tracker to False and return the error message
+            okay = False
+            return okay, f"Error mosaicking NDVI tiles: {e}"
+
+    def calculate_ndvi_cached(self, out_path, band4_index=4, band3_index=3, **kwargs):
+        """
+        Calculate the NDVI (see calculate_ndvi, which any other keyword
+        arguments are passed on to) and save it to out_path -- unless
+        out_path already holds the NDVI of this same, unchanged raster, in
+        which case it's just opened.  Saving is the slowest part, so a rerun
+        with nothing changed is nearly free.
+
+        What out_path was made from (the raster's dataset_fingerprint, the
+        bands, and the other arguments) is kept in a small ".tag" text
+        file next to out_path (see _tag_path).
+
+        Returns a tuple (okay, ndvi_raster), like calculate_ndvi.
+        """
+        okay = True  # Tracker variable for success
+
+        tag = json.dumps({"source": dataset_fingerprint(self.catalogPath),
+                          "bands": [band4_index, band3_index],
+                          "kwargs": {k: repr(v) for k, v in sorted(kwargs.items())}})
+        tag_file = _tag_path(out_path)
+
+        # Reuse the saved NDVI if it was made from exactly this input
+        if arcpy.Exists(out_path) and os.path.exists(tag_file):
+            with open(tag_file) as f:
+                if f.read() == tag:
+                    print(f"{out_path} is already up to date")
+                    return okay, arcpy.Raster(out_path)
+
+        okay, ndvi_raster = self.calculate_ndvi(band4_index, band3_index, **kwargs)
+        if not okay:
+            return okay, ndvi_raster
+
+        try:
+            # The old tag no longer describes out_path once it's overwritten
+            if os.path.exists(tag_file):
+                os.remove(tag_file)
+            if arcpy.Exists(out_path):
+                arcpy.management.Delete(out_path)
+            ndvi_raster.save(out_path)
+            SmartRaster.clear_meta_cache(arcpy.Describe(out_path).catalogPath)
+            with open(tag_file, "w") as f:
+                f.write(tag)
+        except Exception as e:
+            # If there is an error saving the NDVI, set tracker to False and return the error message
+            okay = False
+            return okay, f"Error saving NDVI to {out_path}: {e}"
+        return okay, arcpy.Raster(out_path)
+
+    def calculate_ndvi_gdal(self, out_path, band4_index=4, band3_index=3):
+        """
+        Calculate NDVI with GDAL's band algebra (GDAL 3.11+) and write it to
+        a tiled, compressed GeoTIFF at out_path.  GDAL builds the whole
+        (NIR - Red) / (NIR + Red) expression as one lazy pipeline and only
+        evaluates it block by block as it writes the file.
+
+        Pixels that are NoData in either band are NaN in the NDVI, the same
+        as calculate_ndvi, and NaN is set as the GeoTIFF's NoData value.
+        out_path must end in .tif (or .tiff), since it's always a file, not
+        a dataset in a geodatabase.
+
+        If GDAL (or its band algebra) isn't available in this Python
+        environment, falls back to calculate_ndvi and saves the result.
+
+        Returns a tuple (okay, ndvi_raster), like calculate_ndvi.
+        """
+        okay = True  # Tracker variable for success
+
+        if os.path.splitext(out_path)[1].lower() not in (".tif", ".tiff"):
+            okay = False
+            return okay, f"out_path should be a GeoTIFF file ending in .tif, not {out_path}"
+
+        if gdal is None or not hasattr(gdal.Band, "AsType"):
+            # No band algebra here, so do it the arcpy way and save the result
+            okay, ndvi_raster = self.calculate_ndvi(band4_index, band3_index)
+            if not okay:
+                return okay, ndvi_raster
+            try:
+                ndvi_raster.save(out_path)
+                ndvi_raster = arcpy.Raster(out_path)
+            except Exception as e:
+                # If there is an error saving the NDVI, set tracker to False and return the error message
+                okay = False
+                return okay, f"Error saving NDVI to {out_path}: {e}"
+            return okay, ndvi_raster
+
+        try:
+            # Set up the NDVI expression; nothing is computed yet
+            ds = gdal.Open(self.catalogPath)
+            nir_band = ds.GetRasterBand(band4_index)
+            red_band = ds.GetRasterBand(band3_index)
+            nir = nir_band.AsType(gdal.GDT_Float32)
+            red = red_band.AsType(gdal.GDT_Float32)
+            ndvi = (nir - red) / (nir + red)
+
+            # Pixels that are NoData in either band are NaN, not an NDVI
+            #   made from the NoData values themselves
+            for band in [nir_band, red_band]:
+                nodata = band.GetNoDataValue()
+                if nodata is not None:
+                    ndvi = gdal.where(band == nodata, float("nan"), ndvi)
+        except Exception as e:
+            # If there is an error loading the bands, set tracker to False and return the error message
+            okay = False
+            return okay, f"Error retrieving bands: {e}"
+
+        try:
+            # Writing the copy is what actually runs the pipeline
+            driver = gdal.GetDriverByName("GTiff")
+            out_ds = driver.CreateCopy(out_path, ndvi.GetDataset(),
+                                       options=["TILED=YES", "COMPRESS=DEFLATE", "PREDICTOR=3"])
+            out_ds.GetRasterBand(1).SetNoDataValue(float("nan"))
+            out_ds = None  # Close the file so it is flushed to disk
+            ds = None
+            return okay, arcpy.Raster(out_path)
         except Exception as e:
             # If there is an error during the NDVI calculation, set tracker to False and return the error message
             okay = False
             return okay, f"Error calculating NDVI: {e}"
 
+    def _ndvi_tile_to_raster(self, ndvi, lower_left):
+        # Wrap an NDVI array back up as a raster in the same location, and
+        #   the same coordinate system, as the source (NumPyArrayToRaster
+        #   takes the coordinate system from the environment)
+        nodata = NDVI_INT16_NODATA if ndvi.dtype == np.int16 else np.nan
+        with arcpy.EnvManager(outputCoordinateSystem=self.spatialReference):
+            return arcpy.NumPyArrayToRaster(ndvi, arcpy.Point(*lower_left),
+                                            self.meanCellWidth, self.meanCellHeight,
+                                            value_to_nodata=nodata)
+
+
+if numba is not None:
+    # fastmath is limited to flags that keep NaN handling intact, since
+    #   NaN is what marks the pixels with no NDVI.  Giving the float32
+    #   signature compiles the kernel when the module is imported (or
+    #   loads it from numba's cache), not partway through the first NDVI
+    @numba.njit("void(float32[:, :], float32[:, :], float32[:, :])",
+                parallel=True, fastmath={"nsz", "arcp", "contract"}, cache=True)
+    def _ndvi_kernel_numba(nir, red, out):
+        # Rows are independent, so they're shared out across the cores
+        for i in numba.prange(nir.shape[0]):
+            for j in range(nir.shape[1]):
+                s = nir[i, j] + red[i, j]
+                out[i, j] = (nir[i, j] - red[i, j]) / s if s != 0 else np.nan
+else:
+    _ndvi_kernel_numba = None
+
+
+def _ndvi_array(nir, red, use_numba=True):
+    """
+    Compute the NDVI of two float32 arrays in a single fused pass.
+    Pixels where NIR + Red is zero, or where either band is NaN, are set to NaN.
+    With use_numba=False the parallel numba kernel is skipped, for callers
+    that are already running on several threads of their own.
+    """
+    ndvi = np.empty(nir.shape, dtype=np.float32)
+    if use_numba and _ndvi_kernel_numba is not None:
+        # Compiled loop over the pixels, in parallel over the rows
+        _ndvi_kernel_numba(nir, red, ndvi)
+        return ndvi
+
+    if numexpr is not None:
+        # numexpr evaluates the whole expression in one pass over the
+        #   pixels, in cache-sized chunks, on several threads
+        numexpr.evaluate("where(nir + red != 0, (nir - red) / (nir + red), nodata)",
+                         local_dict={"nir": nir, "red": red, "nodata": np.float32(np.nan)},
+                         out=ndvi, casting="same_kind")
+        return ndvi
+
+    # Otherwise compute the NDVI into the output with NumPy:
+    #   the numerator is written straight into the output, and
+    #   the division is done in place wherever the denominator is non-zero
+    ndvi.fill(np.nan)
+    denominator = nir + red
+    valid = denominator != 0
+    np.subtract(nir, red, out=ndvi, where=valid)
+    np.divide(ndvi, denominator, out=ndvi, where=valid)
+    return ndvi
+
+
+def _quantize_ndvi(ndvi):
+    # Scale a float NDVI array to int16 (NDVI * 10000), with NaN as NDVI_INT16_NODATA
+    scaled = np.clip(np.rint(ndvi / NDVI_INT16_SCALE), -10000, 10000)
+    scaled[np.isnan(ndvi)] = NDVI_INT16_NODATA
+    return scaled.astype(np.int16)
+
+
+def _read_band_window(band, corner, xsize, ysize):
+    # Read a window of a band as float32, with the band's NoData as NaN so it
+    #   carries straight through the NDVI arithmetic
+    values = arcpy.RasterToNumPyArray(band, lower_left_corner=corner,
+                                      ncols=xsize, nrows=ysize).astype(np.float32, copy=False)
+    if band.noDataValue is not None:
+        values[values == band.noDataValue] = np.nan
+    return values
+
+
+def _ndvi_tile(nir_band, red_band, window, lower_left, quantize=False, use_numba=True):
+    """
+    Read one (xoff, yoff, xsize, ysize) window of the NIR and Red bands and
+    return (window, ndvi).  The bands may be given as paths, so this can be
+    run in a worker process.  With quantize=True the NDVI comes back as
+    scaled int16 rather than float32.  use_numba is passed on to
+    _ndvi_array; worker processes turn it off, since every worker running
+    the parallel numba kernel would put workers x cores threads on the CPU.
+    """
+    xoff, yoff, xsize, ysize = window
+    corner = arcpy.Point(*lower_left)
+    if isinstance(nir_band, str):
+        nir_band = arcpy.Raster(nir_band)
+    if isinstance(red_band, str):
+        red_band = arcpy.Raster(red_band)
+
+    # Read the window of each band into a float32 NumPy array, NoData as NaN
+    nir = _read_band_window(nir_band, corner, xsize, ysize)
+    red = _read_band_window(red_band, corner, xsize, ysize)
+    ndvi = _ndvi_array(nir, red, use_numba=use_numba)
+    if quantize:
+        ndvi = _quantize_ndvi(ndvi)
+    return window, ndvi
+
+
+def _ndvi_tile_rasterio(path, band4_index, band3_index, window, quantize=False):
+    """
+    Same as _ndvi_tile, but reads the window with rasterio straight from the
+    multiband raster at path.  Each call opens its own dataset, so it is
+    safe to run on several threads at once.  Because it is run on several
+    threads, it doesn't use the parallel numba kernel: calling that from
+    several threads at once oversubscribes the cores, and with numba's
+    workqueue threading layer it aborts the process.
+    """
+    xoff, yoff, xsize, ysize = window
+    with rasterio.open(path) as src:
+        rio_window = Window(xoff, yoff, xsize, ysize)
+        nir = src.read(band4_index, window=rio_window).astype(np.float32, copy=False)
+        red = src.read(band3_index, window=rio_window).astype(np.float32, copy=False)
+
+        # NoData in either band becomes NaN, and so NaN in the NDVI
+        for band, values in ((band4_index, nir), (band3_index, red)):
+            nodata = src.nodatavals[band - 1]
+            if nodata is not None:
+                values[values == nodata] = np.nan
+    ndvi = _ndvi_array(nir, red, use_numba=False)
+    if quantize:
+        ndvi = _quantize_ndvi(ndvi)
+    return window, ndvi
+
 
 # Potential smart vector layer
 
+# Zonal statistics that SmartVectorLayer can compute itself with NumPy;
+#   anything else is handed to arcpy.sa.ZonalStatisticsAsTable
+VECTORIZED_ZONAL_STATS = ("MEAN", "SUM", "COUNT", "STD")
+SORTED_ZONAL_STATS = ("MINIMUM", "MAXIMUM", "RANGE", "MEDIAN")
+# Left to ZonalStatisticsAsTable, all in one call per raster
+ARCPY_ZONAL_STATS = ("MAJORITY", "MINORITY", "VARIETY")
+# Percentiles can also be asked for by name as "P<percent>", e.g. "P90"
+
+
+# Rasters are read for zonal statistics in tiles of this many cells a side,
+#   unless the raster reports its own block size
+ZONE_TILE_SIZE = 256
+
+# ArcGIS zonal statistic names and their rasterstats equivalents
+RASTERSTATS_NAMES = {"MEAN": "mean", "SUM": "sum", "COUNT": "count", "STD": "std",
+                     "MINIMUM": "min", "MAXIMUM": "max", "RANGE": "range",
+                     "MEDIAN": "median", "MAJORITY": "majority",
+                     "MINORITY": "minority", "VARIETY": "unique"}
+
+
+def _rasterstats_name(stat):
+    # The rasterstats name for an ArcGIS statistic ("P90" -> "percentile_90"), or None
+    if stat in RASTERSTATS_NAMES:
+        return RASTERSTATS_NAMES[stat]
+    if _percentile_of(stat) is not None:
+        return f"percentile_{_percentile_of(stat):g}"
+    return None
+
+
+def _oid_indexed(oids, values):
+    """
+    Spread per-feature values out into one preallocated array indexed by
+    OBJECTID (NaN for OIDs with no value), the same layout the NumPy
+    zonal statistics produce, so every path can share the same join.
+    """
+    oids = np.asarray(oids, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    results = np.full(int(oids.max()) + 1 if len(oids) else 1, np.nan)
+    results[oids] = values
+    return results
+
+
+def _same_spatial_reference(path_a, path_b):
+    # True if two datasets are in the same coordinate system.  Compared by
+    #   factory (EPSG) code where both have one, otherwise by full definition
+    sr_a = arcpy.Describe(path_a).spatialReference
+    sr_b = arcpy.Describe(path_b).spatialReference
+    if sr_a.factoryCode and sr_b.factoryCode:
+        return sr_a.factoryCode == sr_b.factoryCode
+    return sr_a.exportToString() == sr_b.exportToString()
+
+
+def _is_sorted_stat(stat):
+    # True for the statistics that _sorted_zonal_stats can calculate
+    return stat in SORTED_ZONAL_STATS or _percentile_of(stat) is not None
+
+
+def _percentile_of(stat):
+    # The percentile (0-100) a statistic name asks for, or None if it isn't one
+    if stat == "MEDIAN":
+        return 50.0
+    if stat.startswith("P") and stat[1:].isdigit() and int(stat[1:]) <= 100:
+        return float(stat[1:])
+    return None
+
+
+def _bincount_zonal_stats(zones, values, stats):
+    """
+    Reduce (zone, value) pixel pairs to per-zone statistics with np.bincount.
+    Returns a dict of statistic -> array indexed by zone id, with NaN for
+    zones that have no pixels.
+    """
+    results = {}
+    if not stats:
+        return results
+
+    # Sums and pixel counts for every zone id, in one pass each
+    counts = np.bincount(zones)
+    sums = np.bincount(zones, weights=values)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+        for stat in stats:
+            if stat == "COUNT":
+                result = counts.astype(np.float64)
+            elif stat == "SUM":
+                result = sums.copy()
+            elif stat == "MEAN":
+                result = means.copy()
+            else:  # STD, the population standard deviation like ArcGIS uses
+                sq_sums = np.bincount(zones, weights=values * values)
+                result = np.sqrt(np.maximum(sq_sums / counts - means * means, 0))
+
+            # Zones with no pixels get NaN rather than 0
+            result[counts == 0] = np.nan
+            results[stat] = result
+    return results
+
+
+def _sorted_zonal_stats(zones, values, stats):
+    """
+    Reduce (zone, value) pixel pairs to per-zone order statistics by sorting
+    the pixels by zone once, so every zone is a contiguous slice.  Returns a
+    dict of statistic -> array indexed by zone id, with NaN for zones that
+    have no pixels.
+    """
+    results = {}
+    if not stats:
+        return results
+    if len(zones) == 0:
+        # No feature covers a single valid pixel
+        return {stat: np.full(1, np.nan) for stat in stats}
+
+    # Sort the pixels by zone and find where each zone starts and ends
+    order = np.argsort(zones, kind="stable")
+    sorted_zones = zones[order]
+    sorted_values = values[order]
+    zone_ids, starts = np.unique(sorted_zones, return_index=True)
+    ends = np.append(starts[1:], len(sorted_values))
+
+    for stat in stats:
+        if stat == "MINIMUM":
+            per_zone = np.minimum.reduceat(sorted_values, starts)
+        elif stat == "MAXIMUM":
+            per_zone = np.maximum.reduceat(sorted_values, starts)
+        elif stat == "RANGE":
+            per_zone = (np.maximum.reduceat(sorted_values, starts)
+                        - np.minimum.reduceat(sorted_values, starts))
+        else:  # MEDIAN or another percentile
+            q = _percentile_of(stat)
+            if _zonal_percentile_numba is not None:
+                per_zone = np.empty(len(starts))
+                _zonal_percentile_numba(sorted_values, starts, ends, q, per_zone)
+            else:
+                per_zone = np.array([np.percentile(sorted_values[start:end], q)
+                                     for start, end in zip(starts, ends)])
+
+        # Spread the per-zone values out into an array indexed by zone id
+        result = np.full(zone_ids[-1] + 1, np.nan)
+        result[zone_ids] = per_zone
+        results[stat] = result
+    return results
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _zonal_percentile_numba(sorted_values, starts, ends, q, out):
+        # Each zone is its own slice of the sorted values, so the zones
+        #   can be worked on in parallel
+        for i in numba.prange(len(starts)):
+            out[i] = np.percentile(sorted_values[starts[i]:ends[i]], q)
+else:
+    _zonal_percentile_numba = None
+
+
+# Geometry tokens extract_to_pandas_df accepts: each gives one number per feature
+SHAPE_TOKENS = ("SHAPE@X", "SHAPE@Y", "SHAPE@Z", "SHAPE@M",
+                "SHAPE@AREA", "SHAPE@LENGTH")
+
+# The NumPy type each kind of geodatabase field is stored as when a table is
+#   read in chunks with downcast=True.  Chunks can't be downcast on their own
+#   values, or the same column could come out int8 in one chunk and int16 in
+#   the next; Double fields are left as float64
+FIELD_DOWNCAST_TYPES = {"SmallInteger": "int16", "Integer": "int32", "Single": "float32"}
+
+
 class SmartVectorLayer:
-    def __init__(self, feature_class_path):
-        """Initialize with a path to a vector feature class"""
+
+    # Feature layer names already made this session, keyed on the feature
+    #   class's catalog path, so every SmartVectorLayer for the same
+    #   feature class shares one layer
+    _layer_names = {}
+
+    def __init__(self, feature_class_path, force_refresh=False):
+        """
+        Initialize with a path to a vector feature class.  With
+        force_refresh=True, any feature layer already made for it this
+        session is thrown away and made again.
+        """
         self.feature_class = feature_class_path
         
         # Check if the feature class exists, raise an error if not
         if not arcpy.Exists(self.feature_class):
             raise FileNotFoundError(f"{self.feature_class} does not exist.")
+
+        # The feature layer is made the first time it's needed (see layer)
+        self._force_refresh = force_refresh
+        self._layer = None
+
+        # Windows of rasters that cover this layer, and the block-aligned
+        #   tiles they split into, keyed on raster path
+        self._raster_windows = {}
+        self._raster_tiles = {}
+
+        # (name, type) of every field, filled in the first time it's needed
+        self._fields_cache = None
+
+    @property
+    def layer(self):
+        """
+        A feature layer on the feature class, for the geoprocessing tools.
+        MakeFeatureLayer is only run once per feature class per session;
+        after that the existing layer is reused.
+        """
+        if self._layer is None:
+            catalog_path = arcpy.Describe(self.feature_class).catalogPath
+            name = SmartVectorLayer._layer_names.get(catalog_path)
+            if name is None or self._force_refresh or not arcpy.Exists(name):
+                # Name the layer after the feature class plus a hash of its full
+                #   path, so feature classes with the same name in different
+                #   workspaces never end up sharing (and deleting) a layer
+                path_hash = hashlib.blake2b(catalog_path.lower().encode(), digest_size=4).hexdigest()
+                name = name or f"{arcpy.ValidateTableName(os.path.basename(catalog_path))}_{path_hash}_lyr"
+                if arcpy.Exists(name):
+                    arcpy.management.Delete(name)
+                arcpy.management.MakeFeatureLayer(self.feature_class, name)
+                SmartVectorLayer._layer_names[catalog_path] = name
+            self._force_refresh = False
+            self._layer = name
+        return self._layer
+
+    @property
+    def fields(self):
+        """List of (name, type) for the fields in the feature class."""
+        # ListFields goes back to the geodatabase, so only do it once
+        if self._fields_cache is None:
+            self._fields_cache = [(f.name, f.type) for f in arcpy.ListFields(self.feature_class)]
+        return self._fields_cache
+
+    @property
+    def attribute_fields(self):
+        """
+        Names of the attribute fields: every field but the geometry, the OID,
+        and Blob or Raster fields, which can't be copied into NumPy columns.
+        """
+        # Built from the cached field list, so there's no ListFields call here
+        return [name for name, ftype in self.fields
+                if ftype not in ('Geometry', 'OID', 'Blob', 'Raster')]
     
     def summarize_field(self, field):
         """
@@ -96,7 +915,7 @@ class SmartVectorLayer:
 
         try: 
             # Get a list of all fields in the feature class
-            existing_fields = [f.name for f in arcpy.ListFields(self.feature_class)]
+            existing_fields = [name for name, ftype in self.fields]
             
             # Check if the specified field exists
             if field not in existing_fields:
@@ -108,12 +927,15 @@ class SmartVectorLayer:
             print(f"Problem checking the fields: {e}")
 
         try: 
-            # Use a SearchCursor to extract values from the specified field
-            with arcpy.da.SearchCursor(self.feature_class, [field]) as cursor:
-                vals = [row[0] for row in cursor if row[0] is not None and not math.isnan(row[0])]
-            
-            # Calculate the mean of the field values
-            mean = sum(vals) / len(vals)
+            # Pull the whole field into a NumPy array in one call, leaving the nulls out
+            vals = arcpy.da.TableToNumPyArray(self.feature_class, [field],
+                                              skip_nulls=True)[field]
+            vals = vals.astype(np.float64)
+
+            # Calculate the mean of the field values, ignoring the NaNs
+            if np.isnan(vals).all():
+                raise ValueError(f"no values in field {field}")
+            mean = float(np.nanmean(vals))
             return okay, mean
         except Exception as e:
             # Handle errors during mean calculation
@@ -121,6 +943,429 @@ class SmartVectorLayer:
             okay = False
             return okay, None
 
+    def summarize(self, group_field, value_field, how="mean"):
+        """
+        Summarize one field by the values of another, e.g. the mean NDVI
+        for each zoning code, with a single pandas groupby.
+
+        Parameters:
+        - group_field: field to group the features by
+        - value_field: field to summarize within each group
+        - how: any pandas aggregation ("mean", "count", "sum", "median", ...)
+          or a list of them
+
+        Returns:
+        - A tuple (okay, summary), where summary is a pandas Series (or
+          DataFrame, if how is a list) indexed by group, or None on failure
+        """
+        # Check the fields are really there
+        missing = [f for f in [group_field, value_field] if f not in self.attribute_fields]
+        if missing:
+            print(f"Fields {missing} are not in {self.feature_class}")
+            okay = False
+            return okay, None
+
+        # Only the value field is made numeric; the group field keeps its
+        #   own type, so text groups like zoning codes aren't turned into NaN
+        okay, df = self._read_df([group_field, value_field], coerce=[value_field])
+        if not okay:
+            return okay, None
+
+        try:
+            # Groups come out in the order they're first seen (no sort), and
+            #   unused categories are skipped
+            summary = df.groupby(group_field, sort=False, observed=True)[value_field].agg(how)
+            return okay, summary
+        except Exception as e:
+            # Handle errors during the summary
+            print(f"Problem summarizing {value_field} by {group_field}: {e}")
+            okay = False
+            return okay, None
+
+    def _raster_window(self, raster_path):
+        """
+        Find the part of a raster that lies under this layer's features,
+        snapped outwards to whole cells.  Returns (extent, lower_left, ncols,
+        nrows); the result is cached since the features don't move.
+        """
+        if raster_path in self._raster_windows:
+            return self._raster_windows[raster_path]
+
+        raster = arcpy.Raster(raster_path)
+        r_ext = raster.extent
+        # The features' extent in the raster's coordinate system, so the two
+        #   can be compared number for number
+        r_sr = arcpy.Describe(raster_path).spatialReference
+        fc_ext = arcpy.Describe(self.feature_class).extent.projectAs(r_sr)
+        cell_x = raster.meanCellWidth
+        cell_y = raster.meanCellHeight
+
+        # Intersect the two extents, rounding out to the raster's cell edges
+        xmin = max(r_ext.XMin, r_ext.XMin + math.floor((fc_ext.XMin - r_ext.XMin) / cell_x) * cell_x)
+        xmax = min(r_ext.XMax, r_ext.XMin + math.ceil((fc_ext.XMax - r_ext.XMin) / cell_x) * cell_x)
+        ymin = max(r_ext.YMin, r_ext.YMin + math.floor((fc_ext.YMin - r_ext.YMin) / cell_y) * cell_y)
+        ymax = min(r_ext.YMax, r_ext.YMin + math.ceil((fc_ext.YMax - r_ext.YMin) / cell_y) * cell_y)
+        ncols = max(0, round((xmax - xmin) / cell_x))
+        nrows = max(0, round((ymax - ymin) / cell_y))
+
+        window = (arcpy.Extent(xmin, ymin, xmax, ymax), arcpy.Point(xmin, ymin), ncols, nrows)
+        self._raster_windows[raster_path] = window
+        return window
+
+    def _zone_labels(self, raster_path):
+        """
+        Burn each feature's OBJECTID onto the grid of the raster, over the
+        window of the raster under the features.  Returns a flat array of
+        zone ids (0 for cells outside every feature).
+        """
+        extent, lower_left, ncols, nrows = self._raster_window(raster_path)
+        if ncols == 0 or nrows == 0:
+            # The features don't overlap the raster at all
+            return np.empty(0, dtype=np.int64)
+
+        zone_raster = r"memory\temp_zones"
+        if arcpy.Exists(zone_raster):
+            arcpy.management.Delete(zone_raster)
+
+        # Rasterize the features so their cells line up with the value raster.
+        #   A cell belongs to the parcel its center falls in, the same rule
+        #   ArcGIS's own zonal statistics use.  The zone raster is tiled so
+        #   it can be read back tile by tile like the value raster.  The
+        #   features are projected into the raster's coordinate system on
+        #   the way, in case the two differ
+        with arcpy.EnvManager(snapRaster=raster_path, extent=extent,
+                              outputCoordinateSystem=arcpy.Describe(raster_path).spatialReference,
+                              tileSize=f"{ZONE_TILE_SIZE} {ZONE_TILE_SIZE}",
+                              **ARCPY_TOOL_ENV):
+            arcpy.conversion.PolygonToRaster(self.layer, "OBJECTID", zone_raster,
+                                             cell_assignment="CELL_CENTER",
+                                             cellsize=raster_path)
+
+        zones = self._read_tiles(zone_raster, self._raster_tiles_for(raster_path), nodata_to_value=0)
+        arcpy.management.Delete(zone_raster)
+        return zones.astype(np.int64)
+
+    def _raster_tiles_for(self, raster_path):
+        """
+        Split the window of a raster under the features into tiles that line
+        up with the raster's own blocks, so every read touches whole blocks.
+        Returns a list of (lower_left, ncols, nrows); cached like the window.
+        """
+        if raster_path in self._raster_tiles:
+            return self._raster_tiles[raster_path]
+
+        extent, lower_left, ncols, nrows = self._raster_window(raster_path)
+        raster = arcpy.Raster(raster_path)
+        r_ext = raster.extent
+        cell_x = raster.meanCellWidth
+        cell_y = raster.meanCellHeight
+        try:
+            info = raster.getRasterInfo()
+            bx, by = info.getBlockWidth(), info.getBlockHeight()
+        except Exception:
+            bx = by = ZONE_TILE_SIZE
+
+        # The window in raster columns and rows (rows count down from the top)
+        col0 = round((extent.XMin - r_ext.XMin) / cell_x)
+        row0 = round((r_ext.YMax - extent.YMax) / cell_y)
+
+        # Walk the blocks the window touches, top to bottom, left to right
+        tiles = []
+        for r in range(row0 - row0 % by, row0 + nrows, by):
+            r_start, r_end = max(r, row0), min(r + by, row0 + nrows)
+            for c in range(col0 - col0 % bx, col0 + ncols, bx):
+                c_start, c_end = max(c, col0), min(c + bx, col0 + ncols)
+                corner = arcpy.Point(r_ext.XMin + c_start * cell_x, r_ext.YMax - r_end * cell_y)
+                tiles.append((corner, c_end - c_start, r_end - r_start))
+
+        self._raster_tiles[raster_path] = tiles
+        return tiles
+
+    def _read_tiles(self, raster, tiles, **kwargs):
+        # Read a raster tile by tile and string the tiles together into one
+        #   flat array.  Any two rasters read with the same tiles line up
+        #   cell for cell, which is all the zonal statistics need
+        if not tiles:
+            return np.empty(0)
+        return np.concatenate([
+            arcpy.RasterToNumPyArray(raster, lower_left_corner=corner,
+                                     ncols=ncols, nrows=nrows, **kwargs).ravel()
+            for corner, ncols, nrows in tiles])
+
+    def _window_values(self, raster_path, tiles):
+        # Read the tiles of a raster as a flat float array, with NoData as NaN
+        value_raster = arcpy.Raster(raster_path)
+        values = self._read_tiles(value_raster, tiles).astype(np.float64)
+        if value_raster.noDataValue is not None:
+            values[values == value_raster.noDataValue] = np.nan
+        return values
+
+    def _zone_arrays(self, raster_path):
+        """
+        Return two flat arrays, (zones, values), holding the zone id and the
+        raster value of every pixel that falls in a feature and is not NoData.
+        Only the window of the raster under the features is read.
+        """
+        zones = self._zone_labels(raster_path)
+        if len(zones) == 0:
+            return zones, np.empty(0)
+        values = self._window_values(raster_path, self._raster_tiles_for(raster_path))
+
+        # Keep only the pixels that are inside a feature and have a value
+        valid = (zones > 0) & ~np.isnan(values)
+        return zones[valid], values[valid]
+
+    def zonal_stats_vectorized(self, raster_path, statistic_type="MEAN"):
+        """
+        Calculate a zonal statistic for every feature in a single pass over
+        the raster, instead of having ArcGIS compute it zone by zone.
+
+        Parameters:
+        - raster_path: path to the raster
+        - statistic_type: one of VECTORIZED_ZONAL_STATS ("MEAN", "SUM", etc.)
+
+        Returns:
+        - A tuple (okay, stats), where stats is a NumPy array indexed by
+          OBJECTID (NaN for features with no pixels), or an error message
+        """
+        okay = True  # Tracker variable for success
+
+        if statistic_type not in VECTORIZED_ZONAL_STATS:
+            okay = False
+            return okay, f"statistic {statistic_type} is not one of {VECTORIZED_ZONAL_STATS}"
+
+        try:
+            zones, values = self._zone_arrays(raster_path)
+        except Exception as e:
+            # Handle errors while rasterizing the features or reading the raster
+            okay = False
+            return okay, f"Error building zone arrays: {e}"
+
+        return okay, _bincount_zonal_stats(zones, values, [statistic_type])[statistic_type]
+
+    def zonal_stats_sorted(self, raster_path, statistic_type="MEDIAN"):
+        """
+        Calculate a zonal statistic that can't be built up from sums, like
+        the median.  The pixels are sorted by zone id once, so every zone
+        is a contiguous slice of the sorted values, rather than scanning
+        the whole raster for each zone.
+
+        Parameters:
+        - raster_path: path to the raster
+        - statistic_type: one of SORTED_ZONAL_STATS ("MEDIAN", "RANGE", etc.),
+          or a percentile such as "P90"
+
+        Returns:
+        - A tuple (okay, stats), where stats is a NumPy array indexed by
+          OBJECTID (NaN for features with no pixels), or an error message
+        """
+        okay = True  # Tracker variable for success
+
+        if not _is_sorted_stat(statistic_type):
+            okay = False
+            return okay, f"statistic {statistic_type} is not one of {SORTED_ZONAL_STATS} or a percentile"
+
+        try:
+            zones, values = self._zone_arrays(raster_path)
+        except Exception as e:
+            # Handle errors while rasterizing the features or reading the raster
+            okay = False
+            return okay, f"Error building zone arrays: {e}"
+
+        return okay, _sorted_zonal_stats(zones, values, [statistic_type])[statistic_type]
+
+    def zonal_stats_bulk(self, rasters, stats, output_fields):
+        """
+        Calculate several zonal statistics for several rasters and write each
+        to a new field.  The features are rasterized once and every raster
+        is read once, however many statistics are asked for.  Statistics
+        NumPy can't do (ARCPY_ZONAL_STATS) take one ZonalStatisticsAsTable
+        call per raster between them.  The rasters must all be on the same
+        grid (extent, cell size and coordinate system); if they aren't,
+        nothing is calculated.
+
+        Parameters:
+        - rasters: list of raster paths
+        - stats: list of statistics, each from VECTORIZED_ZONAL_STATS,
+          SORTED_ZONAL_STATS or ARCPY_ZONAL_STATS, or a percentile such as "P90"
+        - output_fields: list of new field names, one per (raster, statistic)
+          pair, ordered raster by raster, e.g. for rasters [a, b] and stats
+          [MEAN, STD]: [a_MEAN, a_STD, b_MEAN, b_STD]
+        """
+        okay = True  # Tracker variable for success
+
+        # Check that the request makes sense before doing any work
+        numpy_stats = [s for s in stats if s in VECTORIZED_ZONAL_STATS or _is_sorted_stat(s)]
+        arcpy_stats = [s for s in stats if s in ARCPY_ZONAL_STATS]
+        unsupported = [s for s in stats if s not in numpy_stats and s not in arcpy_stats]
+        if unsupported:
+            okay = False
+            return okay, f"statistics {unsupported} can't be calculated in bulk"
+        if len(output_fields) != len(rasters) * len(stats):
+            okay = False
+            return okay, f"expected {len(rasters) * len(stats)} output fields, got {len(output_fields)}"
+        if numpy_stats and len(rasters) > 1:
+            # Every raster is read with the first one's tiles and zone ids,
+            #   which is only right if they're all on the same grid
+            try:
+                first = arcpy.Raster(rasters[0])
+                off_grid = []
+                for r in rasters[1:]:
+                    raster = arcpy.Raster(r)
+                    # Corners within a small fraction of a cell count as equal
+                    tol = 0.01 * min(first.meanCellWidth, first.meanCellHeight)
+                    corners = [(raster.extent.XMin, first.extent.XMin), (raster.extent.YMin, first.extent.YMin),
+                               (raster.extent.XMax, first.extent.XMax), (raster.extent.YMax, first.extent.YMax)]
+                    if (any(abs(a - b) > tol for a, b in corners)
+                            or not math.isclose(raster.meanCellWidth, first.meanCellWidth)
+                            or not math.isclose(raster.meanCellHeight, first.meanCellHeight)
+                            or not _same_spatial_reference(r, rasters[0])):
+                        off_grid.append(r)
+            except Exception as e:
+                okay = False
+                return okay, e
+            if off_grid:
+                okay = False
+                return okay, f"rasters {off_grid} aren't on the same grid as {rasters[0]}"
+        if arcpy_stats:
+            # ArcGIS only works out MAJORITY, MINORITY and VARIETY for integer
+            #   rasters; a floating point raster (like the NDVI) has no such columns
+            try:
+                float_rasters = [r for r in rasters if not arcpy.Raster(r).isInteger]
+            except Exception as e:
+                okay = False
+                return okay, e
+            if float_rasters:
+                okay = False
+                return okay, (f"statistics {arcpy_stats} need integer rasters, "
+                              f"but {float_rasters} are floating point")
+
+        try:
+            # Check if any of the output fields already exist
+            existing_fields = [name for name, ftype in self.fields]
+            clashes = [f for f in output_fields if f in existing_fields]
+            if clashes:
+                okay = False
+                error_msg = f"fields {clashes} already exist"
+                return okay, error_msg
+        except Exception as e:
+            # Handle errors during field checking
+            okay = False
+            error_msg = e
+            return okay, error_msg
+
+        try:
+            # Rasterize the zones once, and work out which cells are inside a feature
+            if numpy_stats:
+                tiles = self._raster_tiles_for(rasters[0])
+                zones = self._zone_labels(rasters[0])
+                in_zone = zones > 0
+
+            # One read per raster; every statistic comes from the same values
+            results = []
+            for raster_path in rasters:
+                per_stat = {}
+                if numpy_stats:
+                    values = self._window_values(raster_path, tiles) if len(zones) else np.empty(0)
+                    valid = in_zone & ~np.isnan(values)
+                    z, v = zones[valid], values[valid]
+                    per_stat.update(_bincount_zonal_stats(z, v, [s for s in stats if s in VECTORIZED_ZONAL_STATS]))
+                    per_stat.update(_sorted_zonal_stats(z, v, [s for s in stats if _is_sorted_stat(s)]))
+                if arcpy_stats:
+                    per_stat.update(self._arcpy_zonal_stats(raster_path, arcpy_stats))
+                results.extend(per_stat[s] for s in stats)
+            print(f"Processed {len(rasters)} raster(s) x {len(stats)} zonal stat(s)")
+        except Exception as e:
+            # Handle errors during zonal statistics calculation
+            okay = False
+            error_msg = e
+            return okay, error_msg
+
+        print("Joining zonal stats back to Object ID")
+        try:
+            # Write all of the new fields in a single join
+            self._extend_with_zonal_results(results, output_fields)
+        except Exception as e:
+            # Handle errors during feature class update
+            print(f"Problem updating feature class: {e}")
+            okay = False
+            error_msg = e
+            return okay, error_msg
+
+        print(f"Zonal stats added to fields {output_fields}.")
+        return okay, None
+
+    def _extend_with_zonal_results(self, results, output_fields):
+        """
+        Add new fields to the feature class from arrays indexed by OBJECTID
+        (one per field), using a single da.ExtendTable join rather than
+        writing the rows one at a time.  Features with no values are left null.
+        """
+        # Line the results up as rows of a table, one column per OBJECTID
+        table = np.full((len(results), max(len(r) for r in results)), np.nan)
+        for i, result in enumerate(results):
+            table[i, :len(result)] = result
+        oids = np.flatnonzero(~np.isnan(table).all(axis=0))
+
+        if len(oids) == 0:
+            # No feature got a value, and ExtendTable with no rows may not
+            #   add the fields at all; add them empty so later steps find them
+            for field in output_fields:
+                arcpy.management.AddField(self.feature_class, field, "DOUBLE")
+        else:
+            # Build a structured array keyed on OBJECTID and join it onto the feature class
+            arr = np.empty(len(oids), dtype=[("OBJECTID", np.int32)] + [(f, np.float64) for f in output_fields])
+            arr["OBJECTID"] = oids
+            for i, field in enumerate(output_fields):
+                arr[field] = table[i, oids]
+            arcpy.da.ExtendTable(self.feature_class, "OBJECTID", arr, "OBJECTID", append_only=False)
+
+        # The feature class has new fields now, which the layer made before
+        #   them doesn't have; make it again the next time it's needed
+        self._fields_cache = None
+        self._layer = None
+        self._force_refresh = True
+
+    def _arcpy_zonal_stats(self, raster_path, stats):
+        """
+        Calculate zonal statistics with a single ZonalStatisticsAsTable call
+        (asking for "ALL" when more than one is needed) and read them back
+        in one go.  Returns a dict of statistic -> array indexed by OBJECTID.
+        """
+        # ZonalStatisticsAsTable needs Spatial Analyst; it's only checked out
+        #   here, when it's needed, rather than every time the module loads
+        status = arcpy.CheckOutExtension("Spatial")
+        if status != "CheckedOut":
+            raise RuntimeError(f"Spatial Analyst isn't available ({status})")
+
+        # Create a temporary table to hold zonal statistics
+        temp_table = r"memory\temp_zonal_stats"
+        if arcpy.Exists(temp_table):
+            arcpy.management.Delete(temp_table)
+
+        try:
+            # Calculate zonal statistics using the specified raster and statistic type(s)
+            with arcpy.EnvManager(**ARCPY_TOOL_ENV):
+                arcpy.sa.ZonalStatisticsAsTable(
+                    in_zone_data=self.layer,
+                    zone_field="OBJECTID",
+                    in_value_raster=raster_path,
+                    out_table=temp_table,
+                    statistics_type=stats[0] if len(stats) == 1 else "ALL"
+                )
+
+            # Read the zonal statistics results from the temporary table in one call
+            table = arcpy.da.TableToNumPyArray(temp_table, ["OBJECTID_1"] + list(stats),
+                                               skip_nulls=True)
+            print(f"Processed {len(table)} zonal stats")
+        finally:
+            # Clean up the temporary table
+            if arcpy.Exists(temp_table):
+                arcpy.management.Delete(temp_table)
+
+        # Spread the results out into arrays indexed by OBJECTID
+        return {stat: _oid_indexed(table["OBJECTID_1"], table[stat]) for stat in stats}
+
     def zonal_stats_to_field(self, raster_path, statistic_type="MEAN", output_field="ZonalStat"):
         """
         For each feature in the vector layer, calculates the zonal statistic from the raster
@@ -131,72 +1376,97 @@ class SmartVectorLayer:
         - statistic_type: type of statistic ("MEAN", "SUM", etc.)
         - output_field: name of the field to create to store results
         """
+        if statistic_type in VECTORIZED_ZONAL_STATS or _is_sorted_stat(statistic_type):
+            # Fast path: rasterize the features once and reduce with NumPy
+            return self.zonal_stats_bulk([raster_path], [statistic_type], [output_field])
+        if (rasterstats is not None and _rasterstats_name(statistic_type) is not None
+                and _same_spatial_reference(self.feature_class, raster_path)):
+            # Next best: let rasterstats do it, with no intermediate table.
+            #   rasterstats doesn't reproject, so this is only tried when the
+            #   features and the raster share a coordinate system.  It can't
+            #   open every raster arcpy can (e.g. some geodatabase rasters),
+            #   so fall back to ZonalStatisticsAsTable if it fails
+            okay, error_msg = self.zonal_stats_rasterstats(raster_path, statistic_type, output_field)
+            if okay:
+                return okay, error_msg
+            print(f"rasterstats couldn't do it ({error_msg}); using ZonalStatisticsAsTable instead")
+
+        # Everything else goes through ZonalStatisticsAsTable, via the same bulk path
+        return self.zonal_stats_bulk([raster_path], [statistic_type], [output_field])
+
+    def zonal_stats_rasterstats(self, raster_path, statistic_type="MEAN", output_field="ZonalStat"):
+        """
+        Same as zonal_stats_to_field, but the statistic is worked out by the
+        rasterstats package straight from the geometries and the raster, so
+        there's no ZonalStatisticsAsTable table to write and read back.
+        The features must be in the same coordinate system as the raster.
+
+        Parameters:
+        - raster_path: path to the raster
+        - statistic_type: an ArcGIS statistic name from RASTERSTATS_NAMES,
+          or a percentile such as "P90"
+        - output_field: name of the field to create to store results
+        """
         okay = True  # Tracker variable for success
 
+        if rasterstats is None:
+            okay = False
+            return okay, "rasterstats is not installed"
+        stat_name = _rasterstats_name(statistic_type)
+        if stat_name is None:
+            okay = False
+            return okay, f"rasterstats can't calculate {statistic_type}"
+        if not _same_spatial_reference(self.feature_class, raster_path):
+            # rasterstats would just find no cells under any feature
+            okay = False
+            return okay, "the features and the raster are in different coordinate systems"
+
         try:
             # Check if the output field already exists
-            existing_fields = [f.name for f in arcpy.ListFields(self.feature_class)]
-            if output_field not in existing_fields:
-                # Add the output field if it doesn't exist
-                arcpy.AddField_management(self.feature_class, output_field, "DOUBLE")
-            else:
-                # If the field exists, return an error message
+            existing_fields = [name for name, ftype in self.fields]
+            if output_field in existing_fields:
                 okay = False
                 error_msg = f"field {output_field} already exists"
                 return okay, error_msg
         except Exception as e:
-            # Handle errors during field addition
+            # Handle errors during field checking
             okay = False
             error_msg = e
             return okay, error_msg
 
-        # Create a temporary table to hold zonal statistics
-        temp_table = "in_memory\\temp_zonal_stats"
-        if arcpy.Exists(temp_table):
-            arcpy.management.Delete(temp_table)
-        
         try:
-            # Calculate zonal statistics using the specified raster and statistic type
-            zone_field = "OBJECTID"
-            arcpy.sa.ZonalStatisticsAsTable(
-                in_zone_data=self.feature_class,
-                zone_field=zone_field,
-                in_value_raster=raster_path,
-                out_table=temp_table,
-                statistics_type=statistic_type
-            )
+            # Read the geometries once, keeping track of which OBJECTID each one is
+            with arcpy.da.SearchCursor(self.feature_class, ["OID@", "SHAPE@"]) as cursor:
+                rows = list(cursor)
+            oids = np.array([row[0] for row in rows], dtype=np.int64)
+            shapes = [row[1] for row in rows]
+
+            # All of the zones in one call; cells count if their center is in
+            #   the feature, the same rule as the rest of this class
+            # rasterstats opens the raster itself, so it needs the full path,
+            #   not a name relative to arcpy.env.workspace
+            raster_file = arcpy.Describe(raster_path).catalogPath
+            stats = rasterstats.zonal_stats(shapes, raster_file, stats=[stat_name],
+                                            all_touched=False, geojson_out=False)
+            print(f"Processed {len(stats)} zonal stats")
         except Exception as e:
             # Handle errors during zonal statistics calculation
             okay = False
             error_msg = e
             return okay, error_msg
 
-        # Dictionary to store zonal statistics results
-        zonal_results = {}
-        
-        try:
-            # Read the zonal statistics results from the temporary table
-            table_count = 0
-            with arcpy.da.SearchCursor(temp_table, ["OBJECTID_1", statistic_type]) as cursor:
-                for row in cursor:
-                    zonal_results[row[0]] = row[1]
-                    table_count += 1
-            print(f"Processed {table_count} zonal stats")
-        except Exception as e:
-            # Handle errors during table reading
-            print(f"Problem reading the zonal results table: {e}")
+        # No value for any feature means the raster and features didn't line
+        #   up at all, not that every parcel is empty
+        values = [np.nan if st[stat_name] is None else st[stat_name] for st in stats]
+        if len(values) and np.isnan(values).all():
             okay = False
-            return okay, f"Read error: {e}"
-        
+            return okay, "rasterstats found no raster cells under any feature"
+
         print("Joining zonal stats back to Object ID")
         try:
-            # Update the feature class with the zonal statistics results
-            with arcpy.da.UpdateCursor(self.feature_class, ["OBJECTID", output_field]) as cursor:
-                for row in cursor:
-                    oid = row[0]
-                    if oid in zonal_results:
-                        row[1] = zonal_results[oid]
-                        cursor.updateRow(row)
+            # Spread the results out into an array indexed by OBJECTID and join it on
+            results = _oid_indexed(oids, values)
+            self._extend_with_zonal_results([results], [output_field])
         except Exception as e:
             # Handle errors during feature class update
             print(f"Problem updating feature class: {e}")
@@ -204,40 +1474,92 @@ class SmartVectorLayer:
             error_msg = e
             return okay, error_msg
 
-        # Clean up the temporary table
-        arcpy.management.Delete(temp_table)
-
         print(f"Zonal stats '{statistic_type}' added to field '{output_field}'.")
         return okay, None
 
-    def save_as(self, output_path):
+    def save_as(self, output_path, keep_fields=None):
         """
-        Save the current vector layer to a new feature class.
+        Save the current vector layer to a new feature class.  With
+        keep_fields (a list of field names), only those attribute fields are
+        written, which is much less to copy than every parcel attribute.
         """
-        arcpy.management.CopyFeatures(self.feature_class, output_path)
-        print(f"Saved to {output_path}")
+        if keep_fields is None:
+            with arcpy.EnvManager(**ARCPY_TOOL_ENV):
+                arcpy.management.CopyFeatures(self.feature_class, output_path)
+            print(f"Saved to {output_path}")
+            return
 
-    def extract_to_pandas_df(self, fields=None):
+        # Check the fields to keep are really there
+        missing = [f for f in keep_fields if f not in self.attribute_fields]
+        if missing:
+            print(f"Fields {missing} are not in {self.feature_class}; nothing saved")
+            return
+
+        # Map across only the fields being kept.  (Starting from every field
+        #   and removing the rest doesn't work: read-only fields such as
+        #   Shape_Length, Shape_Area and GlobalID have no field map to remove)
+        field_mappings = arcpy.FieldMappings()
+        for name in keep_fields:
+            field_map = arcpy.FieldMap()
+            field_map.addInputField(self.feature_class, name)
+            field_mappings.addFieldMap(field_map)
+
+        # Save it next to the output path, or in the workspace if no folder was given
+        out_location, out_name = os.path.split(output_path)
+        with arcpy.EnvManager(**ARCPY_TOOL_ENV):
+            arcpy.conversion.FeatureClassToFeatureClass(self.feature_class, out_location or arcpy.env.workspace,
+                                                        out_name, field_mapping=field_mappings)
+
+        # Check the output ended up with exactly the fields asked for (the
+        #   OID, the geometry and fields ArcGIS maintains itself aside)
+        saved = [f.name for f in arcpy.ListFields(output_path)
+                 if f.editable and f.type not in ('OID', 'Geometry', 'GlobalID')]
+        if sorted(saved) != sorted(keep_fields):
+            print(f"Warning: {output_path} has fields {saved}, expected {list(keep_fields)}")
+        print(f"Saved {keep_fields} to {output_path}")
+
+    def extract_to_pandas_df(self, fields=None, chunksize=None, downcast=True):
         """
         Extract the attribute table of the feature class to a pandas DataFrame.
         
         Parameters:
-        - fields: list of fields to include in the DataFrame (default: all fields except geometry and OID)
+        - fields: list of fields to include in the DataFrame (default: all fields except
+          geometry, OID, Blob and Raster fields).
+          The single-number geometry tokens in SHAPE_TOKENS ("SHAPE@X", "SHAPE@AREA", ...)
+          can be included too; "SHAPE@XY" is split into "SHAPE@X" and "SHAPE@Y" columns.
+        - chunksize: optional number of OBJECTIDs per chunk.  If given, the table
+          is read a range of OBJECTIDs at a time, so only one chunk is ever in memory
+        - downcast: store numeric columns in the smallest type that holds their
+          values (e.g. int16 for YEAR_BUILT, float32 for NDVI), which makes the DataFrame
+          smaller and quicker to plot (default: True).  With chunksize, every chunk
+          instead gets the type of the field it came from (see FIELD_DOWNCAST_TYPES),
+          so all of the chunks have the same column types
         
         Returns:
         - A tuple (okay, df), where:
           - okay: Boolean indicating success or failure
-          - df: pandas DataFrame containing the extracted data (or None if an error occurs)
+          - df: pandas DataFrame containing the extracted data (or None if an error occurs),
+            or with chunksize, a generator of DataFrames, one per chunk
         """
         okay = True  # Tracker variable for success
 
-        # If no fields are specified, include all fields except geometry and OID
+        # Work out the attribute fields once, for either branch below
+        true_fields = self.attribute_fields
+
+        # If no fields are specified, include all fields except geometry, OID, Blob and Raster
         if fields is None:
-            fields = [f.name for f in arcpy.ListFields(self.feature_class) if f.type not in ('Geometry', 'OID')]
+            fields = true_fields
         else:
-            # Validate user-specified fields against the actual fields in the feature class
-            true_fields = [f.name for f in arcpy.ListFields(self.feature_class) if f.type not in ('Geometry', 'OID')]
-            disallowed = [user_f for user_f in fields if user_f not in true_fields]
+            # SHAPE@XY is a pair of numbers, which can't be one column; ask for X and Y instead
+            fields = [split for f in fields
+                      for split in (["SHAPE@X", "SHAPE@Y"] if f.upper() == "SHAPE@XY" else [f])]
+
+            # Validate user-specified fields against the actual fields in the feature
+            #   class.  Of the geometry tokens, only ones that give a single number per
+            #   feature fit in a column (SHAPE@ itself gives geometry objects)
+            true_fields = set(true_fields)
+            disallowed = [user_f for user_f in fields
+                          if user_f not in true_fields and user_f.upper() not in SHAPE_TOKENS]
             if len(disallowed) != 0:
                 # If invalid fields are provided, print an error message and return failure
                 print("Fields given by user are not valid for this table")
@@ -245,31 +1567,172 @@ class SmartVectorLayer:
                 okay = False
                 return okay, None
         
-        # Include the OID field along with the specified fields
-        fields_with_oid = ["OID@"] + fields
-        rows = []  # List to store rows extracted from the feature class
+        if chunksize is None:
+            return self._read_df(fields, downcast=downcast)
 
         try:
-            # Use a SearchCursor to extract rows from the feature class
-            with arcpy.da.SearchCursor(self.feature_class, fields_with_oid) as cursor:
-                for row in cursor:
-                    rows.append(row)
+            # Find the range of OBJECTIDs to walk through
+            oid_field = arcpy.Describe(self.feature_class).OIDFieldName
+            oids = arcpy.da.TableToNumPyArray(self.feature_class, ["OID@"])["OID@"]
         except Exception as e:
-            # Handle errors during row extraction
-            print(f"Error reading rows with SearchCursor: {e}")
+            print(f"Problem finding the OBJECTID range: {e}")
             okay = False
             return okay, None
-        
+        if len(oids) == 0:
+            return okay, iter([])
+        return okay, self._iter_df_chunks(fields, oid_field, int(oids.min()), int(oids.max()),
+                                          chunksize, downcast)
+
+    def to_feather(self, path, fields=None):
+        """
+        Extract the attribute table (see extract_to_pandas_df) and also write
+        it to a zstd-compressed Feather file at path.  Reading the Feather
+        file back with SmartPandaOps.from_feather is much faster than going
+        through the geodatabase again, so later runs can start from it.
+
+        Returns a tuple (okay, df), like extract_to_pandas_df.  If only the
+        write fails, okay is False but df is still returned.
+        """
+        okay, df = self.extract_to_pandas_df(fields)
+        if not okay:
+            return okay, df
+
         try:
-            # Define column names for the DataFrame
-            col_names = ["OID"] + fields
-            
-            # Create a pandas DataFrame from the extracted rows
-            df = pd.DataFrame(rows, columns=col_names)
+            df.to_feather(path, compression="zstd")
+            print(f"Saved attributes to {path}")
+        except Exception as e:
+            # Feather needs pyarrow installed
+            print(f"Problem writing {path}: {e}")
+            okay = False
+        return okay, df
+
+    def to_feather_cached(self, path, fields=None):
+        """
+        Same as to_feather, unless path already holds the attributes of
+        this same, unchanged feature class, in which case it's just read
+        back.  What path was made from (the feature class's
+        dataset_fingerprint and the fields) is kept in a small
+        "<path>.tag" text file beside it, like calculate_ndvi_cached.
+
+        Returns a tuple (okay, df), like to_feather.
+        """
+        okay = True  # Tracker variable for success
+
+        try:
+            tag = json.dumps({"source": dataset_fingerprint(self.feature_class),
+                              "fields": fields})
+        except Exception as e:
+            print(f"Problem fingerprinting {self.feature_class}: {e}")
+            okay = False
+            return okay, None
+        tag_file = f"{path}.tag"
+
+        # Reuse the Feather file if it was made from exactly this input
+        if os.path.exists(path) and os.path.exists(tag_file):
+            with open(tag_file) as f:
+                if f.read() == tag:
+                    print(f"{path} is already up to date")
+                    return okay, pd.read_feather(path)
+
+        # The old tag no longer describes path once it's overwritten
+        if os.path.exists(tag_file):
+            os.remove(tag_file)
+        okay, df = self.to_feather(path, fields)
+        if okay:
+            with open(tag_file, "w") as f:
+                f.write(tag)
+        return okay, df
+
+    def _iter_df_chunks(self, fields, oid_field, min_oid, max_oid, chunksize, downcast=True):
+        # Read the table one range of OBJECTIDs at a time, skipping empty ranges.
+        #   Downcasting goes by each field's declared type, not by the values
+        #   in the chunk, so every chunk's columns have the same types
+        field_types = dict(self.fields)
+        dtypes = {f: FIELD_DOWNCAST_TYPES[field_types[f]] for f in fields
+                  if field_types.get(f) in FIELD_DOWNCAST_TYPES} if downcast else {}
+        for lo in range(min_oid, max_oid + 1, chunksize):
+            where = f"{oid_field} >= {lo} AND {oid_field} < {lo + chunksize}"
+            okay, df = self._read_df(fields, where, downcast=False)
+            if not okay:
+                raise RuntimeError(f"Problem reading rows where {where}")
+            if len(df):
+                # Only cast within a kind: an integer field with nulls comes
+                #   through as floats (NaN), which int16 can't hold
+                yield df.astype({f: t for f, t in dtypes.items()
+                                 if df[f].dtype.kind == np.dtype(t).kind})
+
+    def _read_df(self, fields, where_clause=None, downcast=True, coerce=None):
+        # The work behind extract_to_pandas_df, for already-checked fields
+        #   and optionally just the rows matching where_clause.  coerce is
+        #   the fields to force to numeric (default: all of them)
+        okay = True  # Tracker variable for success
+
+        # Include the OID field along with the specified fields
+        fields_with_oid = ["OID@"] + fields
+
+        # Geometry tokens need the feature class version of the bulk reader
+        if any(f.upper().startswith("SHAPE@") for f in fields):
+            to_numpy = arcpy.da.FeatureClassToNumPyArray
+        else:
+            to_numpy = arcpy.da.TableToNumPyArray
+
+        try:
+            # Copy the whole table into a NumPy structured array in one bulk call;
+            #   nulls in numeric fields come through as NaN
+            arr = to_numpy(self.feature_class, fields_with_oid, where_clause=where_clause,
+                           null_value=np.nan, skip_nulls=False)
+            # Build the DataFrame column by column from the array's fields, so
+            #   each column is one contiguous NumPy array
+            df = pd.DataFrame({("OID" if name == "OID@" else name): arr[name]
+                               for name in arr.dtype.names})
+        except Exception as e:
+            # Fields that can't hold NaN (text, integers with nulls) won't convert
+            #   this way, so fall back to reading row by row
+            print(f"Bulk read failed ({e}), reading rows with SearchCursor instead")
+            df = None
+
+        if df is None:
+            rows = []  # List to store rows extracted from the feature class
+
+            try:
+                # Use a SearchCursor to extract rows from the feature class
+                with arcpy.da.SearchCursor(self.feature_class, fields_with_oid,
+                                           where_clause=where_clause) as cursor:
+                    for row in cursor:
+                        rows.append(row)
+            except Exception as e:
+                # Handle errors during row extraction
+                print(f"Error reading rows with SearchCursor: {e}")
+                okay = False
+                return okay, None
             
-            # Convert numeric fields to numeric types, coercing errors to NaN
-            for field in fields:
-                df[field] = pd.to_numeric(df[field], errors='coerce')
+            try:
+                # Define column names for the DataFrame
+                col_names = ["OID"] + fields
+                
+                # Create a pandas DataFrame from the extracted rows
+                df = pd.DataFrame(rows, columns=col_names)
+            except Exception as e:
+                # Handle errors during DataFrame creation
+                print(f"Error creating DataFrame: {e}")
+                okay = False
+                return okay, None
+
+        try:
+            # Numeric fields already have numeric types; convert anything else
+            #   to numeric, coercing errors to NaN
+            for field in (fields if coerce is None else coerce):
+                if df[field].dtype == object:
+                    df[field] = pd.to_numeric(df[field], errors='coerce')
+
+            if downcast:
+                # Shrink each numeric column to the smallest type that still
+                #   holds its values (pandas leaves a column alone if the
+                #   smaller type would change them, e.g. big float IDs)
+                for col in df.select_dtypes('integer').columns:
+                    df[col] = pd.to_numeric(df[col], downcast='integer')
+                for col in df.select_dtypes('float').columns:
+                    df[col] = pd.to_numeric(df[col], downcast='float')
             
             # Return success and the resulting DataFrame
             return okay, df
@@ -280,158 +1743,412 @@ class SmartVectorLayer:
             return okay, None
 
 
+# Above this many points, scatterplots in "auto" mode are drawn as a hexbin
+#   density plot: one hexagon per bin rather than one marker per point.
+#   Above HIST2D_THRESHOLD, they're binned onto a square grid instead,
+#   which is quicker still and drawn as a single image
+HEXBIN_THRESHOLD = 50_000
+HIST2D_THRESHOLD = 100_000
+HIST2D_BINS = 200
+
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _hist2d_numba(x, y, xmin, xmax, ymin, ymax, nx, ny):
+        # Each thread counts its own slice of the points into its own grid,
+        #   so no two threads ever add to the same cell; then the grids are summed
+        n_chunks = numba.get_num_threads()
+        chunk = (len(x) + n_chunks - 1) // n_chunks
+        grids = np.zeros((n_chunks, nx, ny), dtype=np.int64)
+        x_scale = nx / (xmax - xmin)
+        y_scale = ny / (ymax - ymin)
+        for c in numba.prange(n_chunks):
+            for i in range(c * chunk, min((c + 1) * chunk, len(x))):
+                ix = int((x[i] - xmin) * x_scale)
+                iy = int((y[i] - ymin) * y_scale)
+                # The maximum lands on the far edge; count it in the last bin
+                ix = min(max(ix, 0), nx - 1)
+                iy = min(max(iy, 0), ny - 1)
+                grids[c, ix, iy] += 1
+        return grids.sum(axis=0)
+else:
+    _hist2d_numba = None
+
+
+def _hist2d(x, y, nx=HIST2D_BINS, ny=HIST2D_BINS):
+    """
+    Count points into an nx by ny grid spanning the data.  Returns
+    (grid, (xmin, xmax, ymin, ymax)), with grid indexed [x bin, y bin].
+    """
+    xmin, xmax = float(x.min()), float(x.max())
+    ymin, ymax = float(y.min()), float(y.max())
+    # A single value would make a zero-width grid
+    if xmax == xmin:
+        xmin, xmax = xmin - 0.5, xmax + 0.5
+    if ymax == ymin:
+        ymin, ymax = ymin - 0.5, ymax + 0.5
+
+    if _hist2d_numba is not None:
+        grid = _hist2d_numba(x, y, xmin, xmax, ymin, ymax, nx, ny)
+    else:
+        grid, _, _ = np.histogram2d(x, y, bins=(nx, ny), range=((xmin, xmax), (ymin, ymax)))
+    return grid, (xmin, xmax, ymin, ymax)
+
+
+def _draw_points(fig, ax, x, y, mode="auto"):
+    """
+    Draw x against y on ax: as a scatter, a hexbin, or for lots of points
+    a 2-D histogram image.  "auto" picks by the number of points.
+    """
+    if mode not in ("auto", "scatter", "hexbin", "hist2d"):
+        raise ValueError(f"mode must be 'auto', 'scatter', 'hexbin' or 'hist2d', not '{mode}'")
+    if mode == "auto":
+        if len(x) > HIST2D_THRESHOLD:
+            mode = "hist2d"
+        elif len(x) > HEXBIN_THRESHOLD:
+            mode = "hexbin"
+        else:
+            mode = "scatter"
+
+    if mode == "hist2d":
+        grid, extent = _hist2d(x, y)
+        # Empty cells are left blank, like the hexbin's mincnt=1
+        image = ax.imshow(np.ma.masked_equal(grid.T, 0), origin="lower", extent=extent,
+                          aspect="auto", cmap="viridis", interpolation="nearest")
+        fig.colorbar(image, ax=ax, label="count")
+    elif mode == "hexbin":
+        bins = ax.hexbin(x, y, gridsize=200, mincnt=1)
+        fig.colorbar(bins, ax=ax, label="count")
+    else:
+        # Rasterized markers go into vector output (pdf, svg) as one image
+        #   rather than one path per point; float32 is plenty for plotting
+        ax.scatter(x.astype(np.float32), y.astype(np.float32),
+                   s=4, alpha=0.4, linewidths=0, rasterized=True)
+
+
+@functools.lru_cache(maxsize=32)
+def _load_params(path, mtime):
+    """
+    Read a plot control file (columns Param and Value) into a tuple of
+    (param, value) pairs.  The files are only a few lines long, so the
+    stdlib csv reader is quicker than pandas here, and the result is
+    cached on (path, mtime): a file is only read again after it changes.
+    """
+    # utf-8-sig drops the byte-order mark Excel puts at the start of a
+    #   "CSV UTF-8" file, which would otherwise end up in the 'Param' header
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return tuple((row['Param'].strip(), (row['Value'] or '').strip())
+                     for row in csv.DictReader(f, skipinitialspace=True)
+                     if row.get('Param'))
+
+
 # Uncomment this when you get to the appropriate block in the scripts
 #  file and re-load the functions
 
-class smartPanda(pd.DataFrame):
+class SmartPandaOps:
+
+    # This class holds onto a regular pandas DataFrame (self.df) and adds
+    #   plotting methods that work on it, rather than being a special
+    #   kind of DataFrame itself.  If it were a subclass of DataFrame,
+    #   pandas would have to build a new one of our special objects
+    #   after every single operation (every filter, every column pull),
+    #   which adds up.  Holding a plain DataFrame avoids that, and means
+    #   self.df can be handed to anything that expects a normal DataFrame.
+
+    # Instances only ever hold these attributes, so skip the per-instance dict
+    __slots__ = ('_df', '_filtered_xy_cache', '_column_hashes', '_fig')
+
+    def __init__(self, df):
+        # Accept a DataFrame, or anything pandas can make one from
+        self.df = df if isinstance(df, pd.DataFrame) else pd.DataFrame(df)
+        self._fig = None  # Figure for saved plots, made when first needed
+
+    # A few DataFrame basics passed straight through, so smartPanda(df)["x"],
+    #   .columns and len() still work the way they did when it was a DataFrame
+    def __getitem__(self, key):
+        return self.df[key]
 
-    # This next bit is advanced -- don't worry about it unless you're 
-    # curious.  It has to do with the pandas dataframe
-    # being a complicated thing that could be created from a variety
-    #   of types, and also that it creates a new dataframe
-    #   when it does operations.  The use of @property is called
-    #   a "decorator".  The _constructor(self) is a specific 
-    #   expectation of Pandas when it does operations.  This just
-    #   tells it that when it does an operation, make the new thing
-    #   into a special smartPanda type, not an original dataframe. 
+    def __len__(self):
+        return len(self.df)
 
     @property
-    def _constructor(self):
-        return smartPanda
-    
+    def columns(self):
+        return self.df.columns
+
+    @property
+    def df(self):
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        # Filtered (x, y) arrays are cached, keyed on the fields and range
+        #   limits, so plotting the same slice again (e.g. from several
+        #   control files) skips the masking.  A new DataFrame starts a new cache.
+        self._df = df
+        self._filtered_xy_cache = functools.lru_cache(maxsize=32)(self._compute_filtered_xy)
+        self._column_hashes = {}  # (x_field, y_field) -> hash of those two columns
+
+    def clear_cache(self):
+        """Forget the cached plot data; call this after changing self.df in place."""
+        self._filtered_xy_cache.cache_clear()
+        self._column_hashes.clear()
+
+    @classmethod
+    def from_feature_class(cls, feature_class_path, fields="*"):
+        """
+        Build straight from a feature class's attribute table, copying the
+        fields into NumPy in one call (numeric nulls become NaN).
+        """
+        arr = arcpy.da.TableToNumPyArray(feature_class_path, fields,
+                                         null_value=np.nan, skip_nulls=False)
+        return cls(pd.DataFrame({name: arr[name] for name in arr.dtype.names}))
+
+    @classmethod
+    def from_feather(cls, path):
+        """Build from a Feather file, like the ones SmartVectorLayer.to_feather writes."""
+        return cls(pd.read_feather(path))
+
     # here, just set up a method to plot and to allow
     #   the user to define the min and max of the plot. 
 
 
     def scatterplot(self, x_field, y_field, title=None, 
                     x_min=None, x_max=None, 
-                    y_min=None, y_max=None):
-        """Make a scatterplot of two columns, with validation."""
+                    y_min=None, y_max=None, mode="auto"):
+        """
+        Make a scatterplot of two columns, with validation.
+        mode is "scatter", "hexbin", "hist2d", or "auto" to switch to a
+        hexbin density plot when there are more than HEXBIN_THRESHOLD points
+        and a 2-D histogram image above HIST2D_THRESHOLD.
+        Returns False (and draws nothing) if there are no numeric points to plot.
+        """
+        return self._render_scatter(x_field, y_field, None, title,
+                             x_min, x_max, y_min, y_max, mode)
+
+    def save_scatterplot(self, x_field, y_field, outfile, title=None, 
+                    x_min=None, x_max=None, 
+                    y_min=None, y_max=None, mode="auto"):
+        """
+        Make a scatterplot of two columns, with validation, and save it to outfile.
+        Returns False (and saves nothing) if there are no numeric points to plot.
+        """
+        return self._render_scatter(x_field, y_field, outfile, title,
+                             x_min, x_max, y_min, y_max, mode)
+
+    def _render_scatter(self, x_field, y_field, outfile=None, title=None,
+                        x_min=None, x_max=None,
+                        y_min=None, y_max=None, mode="auto"):
+        # Shared by scatterplot (outfile is None: show it on screen)
+        #   and save_scatterplot (save it to outfile)
+        x, y = self._filtered_xy(x_field, y_field, x_min, x_max, y_min, y_max)
+        if len(x) == 0:
+            # Nothing numeric inside the range limits: say so rather than draw an empty plot
+            print(f"No numeric values of {x_field} and {y_field} to plot in the range given")
+            return False
+
+        if outfile is None:
+            fig, ax = plt.subplots(figsize=(8,6))
+        else:
+            fig, ax = self._save_axes()
+        self._render(fig, ax, x, y, x_field, y_field, title, mode)
+
+        if outfile is None:
+            plt.show()
+        elif str(outfile).lower().endswith(".png"):
+            fig.canvas.print_png(outfile)
+        else:
+            # Other formats (jpg, pdf, ...) go through savefig, still on the Agg canvas
+            fig.savefig(outfile)
+        return True
+
+    def _filtered_xy(self, x_field, y_field, x_min=None, x_max=None, y_min=None, y_max=None):
+        # Validate the fields and return the x and y values inside the range
+        #   limits, as contiguous float arrays ready to hand to matplotlib
+        return self._filtered_xy_cache(x_field, y_field, x_min, x_max, y_min, y_max)
+
+    def _compute_filtered_xy(self, x_field, y_field, x_min, x_max, y_min, y_max):
+        # The uncached work behind _filtered_xy
 
         # Validate
         for field in [x_field, y_field]:
-            if field not in self.columns:
+            if field not in self.df.columns:
                 raise ValueError(f"Field '{field}' not found in DataFrame columns.")
 
-        # filter the range
-        df_to_plot = self
+        # filter the range with a single mask, rather than
+        #   copying the DataFrame once for every limit.  The mask starts
+        #   by dropping rows where either value is missing, which can't
+        #   be plotted anyway (and throw off a hexbin's extent)
+        x = self._numeric_column(x_field)
+        y = self._numeric_column(y_field)
+        mask = np.isfinite(x) & np.isfinite(y)
         if x_min is not None:
-            df_to_plot = df_to_plot[df_to_plot[x_field] >= x_min]
+            mask &= x >= x_min
         if x_max is not None:
-            df_to_plot = df_to_plot[df_to_plot[x_field] <= x_max]
+            mask &= x <= x_max
         if y_min is not None:
-            df_to_plot = df_to_plot[df_to_plot[y_field] >= y_min]
+            mask &= y >= y_min
         if y_max is not None:
-            df_to_plot = df_to_plot[df_to_plot[y_field] <= y_max]
+            mask &= y <= y_max
+        x = x[mask]
+        y = y[mask]
 
+        # These arrays are shared through the cache, so don't let them be changed
+        x.flags.writeable = False
+        y.flags.writeable = False
+        return x, y
 
+    def _numeric_column(self, field):
+        # A column as a float array.  Anything that isn't already numeric
+        #   (text, say) is converted with pd.to_numeric first, and values
+        #   that aren't numbers become NaN rather than an error in matplotlib
+        column = self.df[field]
+        if not pd.api.types.is_numeric_dtype(column):
+            column = pd.to_numeric(column, errors='coerce')
+        return column.to_numpy(dtype=np.float64, na_value=np.nan)
 
-        # Proceed to plot
-        plt.figure(figsize=(8,6))
-        plt.scatter(df_to_plot[x_field], df_to_plot[y_field])
-        plt.xlabel(x_field)
-        plt.ylabel(y_field)
-        plt.title(title if title else f"{y_field} vs {x_field}")
-        plt.grid(True)
-        plt.show()
+    def _render(self, fig, ax, x, y, x_field, y_field, title=None, mode="auto"):
+        # Draw the points and label the plot
+        _draw_points(fig, ax, x, y, mode)
+        ax.set_xlabel(x_field)
+        ax.set_ylabel(y_field)
+        ax.set_title(title if title else f"{y_field} vs {x_field}")
+        ax.grid(True)
 
+    def _save_axes(self):
+        # The figure save_scatterplot draws on.  Each SmartPandaOps gets its
+        #   own, made the first time it saves a plot and then cleared and
+        #   redrawn each time rather than built from scratch.  It isn't a
+        #   pyplot figure, so it never pops up on screen or piles up in
+        #   pyplot's list of open figures, and it draws straight onto an
+        #   Agg canvas, so saving never has to start up pyplot's
+        #   interactive backend.
+        if self._fig is None:
+            self._fig = Figure(figsize=(8,6), dpi=150)
+            FigureCanvasAgg(self._fig)
+        # Clear the whole figure, not just the axes, so a hexbin's colorbar goes too
+        self._fig.clear()
+        return self._fig, self._fig.add_subplot()
 
     def mean_field(self, field):
         """Get mean of a field, ignoring NaN."""
-        return self[field].mean(skipna=True)
+        return self.bulk_stats([field], ('mean',)).iloc[0, 0]
 
-    def save_scatterplot(self, x_field, y_field, outfile, title=None, 
-                    x_min=None, x_max=None, 
-                    y_min=None, y_max=None):
-        """Make a scatterplot of two columns, with validation."""
-   
-        # Validate
-        for field in [x_field, y_field]:
-            if field not in self.columns:
-                raise ValueError(f"Field '{field}' not found in DataFrame columns.")
-        
+    def bulk_stats(self, fields, stats=('mean', 'std', 'min', 'max')):
+        """
+        Several statistics for several fields in one call, ignoring NaN.
+        Returns a DataFrame with one row per statistic and one column per
+        field.  pandas runs each reduction over a whole column at a time,
+        and uses the bottleneck package for them if it's installed
+        (pip install bottleneck), which is faster again.
+        """
+        return self.df[list(fields)].agg(list(stats))
 
-        # filter the range
-        df_to_plot = self
-        if x_min is not None:
-            df_to_plot = df_to_plot[df_to_plot[x_field] >= x_min]
-        if x_max is not None:
-            df_to_plot = df_to_plot[df_to_plot[x_field] <= x_max]
-        if y_min is not None:
-            df_to_plot = df_to_plot[df_to_plot[y_field] >= y_min]
-        if y_max is not None:
-            df_to_plot = df_to_plot[df_to_plot[y_field] <= y_max]
-
-        # Proceed to plot
-        plt.figure(figsize=(8,6))
-        plt.scatter(df_to_plot[x_field], df_to_plot[y_field])
-        plt.xlabel(x_field)
-        plt.ylabel(y_field)
-        plt.title(title if title else f"{y_field} vs {x_field}")
-        plt.grid(True)
-        plt.savefig(outfile)
-        plt.close()
+    def _plot_key(self, param_dict):
+        # A short hash of the two columns being plotted and the parameters,
+        #   which changes if either the data or the plot settings change
+        fields = (param_dict['x_field'], param_dict['y_field'])
+
+        # Hashing the columns is a full pass over them, so it's done once per
+        #   pair and kept until self.df is replaced or clear_cache() is
+        #   called, the same as the cached plot arrays
+        column_hash = self._column_hashes.get(fields)
+        if column_hash is None:
+            column_hash = hashlib.blake2b(
+                pd.util.hash_pandas_object(self.df[list(fields)], index=False).to_numpy().tobytes(),
+                digest_size=16).digest()
+            self._column_hashes[fields] = column_hash
+
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(column_hash)
+        digest.update(json.dumps({p: param_dict.get(p) for p in
+                                  ["x_field", "y_field", "x_min", "x_max", "y_min", "y_max"]},
+                                 sort_keys=True).encode())
+        return digest.hexdigest()
 
     def plot_from_file(self, csv_control_file_path):
         # This method reads a CSV control file and uses it to create a scatterplot
         # based on the parameters specified in the file, then saves the plot to a file.
 
-        # First, use pandas to read the .csv file. The file should have two columns:
+        # First, read the .csv file. The file should have two columns:
         # 'Param' and 'Value'. The 'Param' column contains the names of the parameters
         # (e.g., "x_field"), and the 'Value' column contains their corresponding values.
         # Required parameters:
         #   - x_field: string (name of the x-axis field)
         #   - y_field: string (name of the y-axis field)
-        #   - outfile: string (path to the output graphics file)
         # Optional parameters:
+        #   - outfile: string (path to the output graphics file; if left
+        #       out, a name is made up from the fields, e.g.
+        #       plot_YEAR_BUILT_NDVI_mean_<key>.png)
         #   - x_min, x_max, y_min, y_max: numeric (range limits for the axes)
+        #
+        # If the same plot of the same data has already been written, it
+        #   isn't drawn again: each plot's key (a hash of the two columns and
+        #   the parameters) is kept in a .json file next to the graphic.
 
         try: 
-            # Read the CSV file into a pandas DataFrame
-            params = pd.read_csv(csv_control_file_path)
+            # Read the CSV file into a dictionary with 'Param' as keys and 'Value'
+            #   as values (if a parameter is listed twice, the last one wins).
+            #   Unchanged files come straight from the cache
+            mtime = os.path.getmtime(csv_control_file_path)
+            param_dict = dict(_load_params(csv_control_file_path, mtime))
         except Exception as e:
             # Handle errors during file reading
-            print(f"Problem reading the {csv_control_file_path}")
-            return False
-        
-        try:
-            # Convert the DataFrame into a dictionary with 'Param' as keys and 'Value' as values
-            param_dict = {k.strip(): v for k, v in zip(params['Param'], params['Value'])}
-        except Exception as e:
-            # Handle errors during dictionary creation
-            print(f"Problem setting up dictionary: {e}")
+            print(f"Problem reading the {csv_control_file_path}: {e}")
             return False
 
         # Check that all required parameters are present in the dictionary
-        required_params = ["x_field", "y_field", "outfile"]
-        missing = [m for m in required_params if m not in param_dict.keys()]
+        required_params = ["x_field", "y_field"]
+        missing = [m for m in required_params if not param_dict.get(m)]
         if missing:
             # If any required parameters are missing, print an error message and return
             print("The param file needs to have these additional parameters")
             print(missing)
             return False
 
-        # Add default values (None) for optional parameters if they are not provided
+        # Convert the optional parameters to floats; anything missing,
+        #   None, empty or not a number becomes None
         optional_params = ["x_min", "x_max", "y_min", "y_max"]
         for p in optional_params:
             val = param_dict.get(p, None)
             try:
-                # Convert the value to a float if it is not None or an empty string
                 param_dict[p] = float(val) if val not in [None, 'None', ''] else None
             except (ValueError, TypeError):
-                # Handle errors during conversion and set the value to None
                 print(f"Could not convert {p}='{val}' to float.")
                 param_dict[p] = None
+            if param_dict[p] is not None and math.isnan(param_dict[p]):
+                param_dict[p] = None
+
+        try:
+            # Work out this plot's key, and name the output after it if no name was given
+            key = self._plot_key(param_dict)
+            if param_dict.get('outfile') in [None, 'None', '']:
+                param_dict['outfile'] = f"plot_{param_dict['x_field']}_{param_dict['y_field']}_{key}.png"
+
+            # Skip the drawing if this exact plot is already on disk
+            sidecar = f"{param_dict['outfile']}.json"
+            if os.path.exists(param_dict['outfile']) and os.path.exists(sidecar):
+                with open(sidecar) as f:
+                    if json.load(f).get("key") == key:
+                        print(f"{param_dict['outfile']} is already up to date")
+                        return True
+        except Exception as e:
+            # Handle errors while checking for an existing plot
+            print(f"Problem checking for an existing plot: {e}")
+            return False
 
         # Create and save the scatterplot using the parameters from the dictionary
         try:
-            self.save_scatterplot(param_dict['x_field'], 
-                                  param_dict['y_field'], 
-                                  param_dict['outfile'], 
-                                  x_min=param_dict['x_min'], 
-                                  x_max=param_dict['x_max'],
-                                  y_min=param_dict['y_min'],
-                                  y_max=param_dict['y_max'])
+            saved = self.save_scatterplot(param_dict['x_field'], 
+                                          param_dict['y_field'], 
+                                          param_dict['outfile'], 
+                                          x_min=param_dict['x_min'], 
+                                          x_max=param_dict['x_max'],
+                                          y_min=param_dict['y_min'],
+                                          y_max=param_dict['y_max'])
+            if not saved:
+                return False
+            with open(sidecar, "w") as f:
+                json.dump({"key": key}, f)
             print(f"Scatterplot saved to {param_dict['outfile']}")
             return True  # Indicate success
         except Exception as e:
@@ -445,9 +2162,5 @@ class smartPanda(pd.DataFrame):
         
 
 
-
-
-
-
-
-
+# The lab scripts know this class by its original name
+smartPanda = SmartPandaOps
@@ -1,3 +1,4 @@
+import os
 import arcpy
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -5,6 +6,15 @@ import TDH_Lab4_functions as l4
 import importlib
 
 
+def _maybe_reload(mod):
+    # Only reload a module if its file has changed since it was loaded.
+    #   The module records its file's mtime (_mtime) when it's imported,
+    #   so an edit made after that is always picked up.  Reloading re-runs
+    #   the whole module, which throws away its caches (and any compiled
+    #   numba kernels), so skip it when nothing changed
+    if getattr(mod, "_mtime", None) != os.path.getmtime(mod.__file__):
+        importlib.reload(mod)
+
 
 # Block 1:  set up github
 #   1.  Get set up with an account on GitHub
@@ -32,10 +42,10 @@ arcpy.env.workspace = r"C:\GEOG562_TemporaryProjects\Data\Lab4_2025\lab4_starter
 #   have you extend a bit further in the next block.  
 
 #    First, reimport the lab4 functions. Remember why we need to do this? 
-importlib.reload(l4)
+_maybe_reload(l4)
 
 #  Look at the code in the Lab4_functions.py file for the "SmartRaster"
-#   object.  Note the method "_extract_metadata".  Test it out just to see how
+#   object.  Note the "metadata" property.  Test it out just to see how
 #  it works.  Point to the Landsat_image_corv raster, and print out the 
 #   coordinate bounds of the raster
 
@@ -67,23 +77,16 @@ print(r.metadata["bounds"])
 
 #  Again, you'll need to add code to the calculate_ndvi function
 
-okay, ndvi = r.calculate_ndvi()
-
-# Assuming this is okay, write it to a new raster that we can use later
+# Calculate the NDVI and write it to a new raster that we can use later.
+#   calculate_ndvi_cached runs calculate_ndvi and saves the result, but if
+#   the saved NDVI was already made from this same Landsat image it just
+#   opens it rather than calculating and writing it all over again
 out_ndvi_file = "NDVI_corv"
+okay, ndvi = r.calculate_ndvi_cached(out_ndvi_file)
 if okay: 
-    print("NDVI calculation successful.")
-    #Check first if the file already exists
-    if arcpy.Exists(out_ndvi_file):
-        print(f"{out_ndvi_file} already exists. ")
-    # Write the NDVI raster to a new file
-    try:
-        ndvi.save(out_ndvi_file)
-        print(f"{out_ndvi_file} written successfully.")
-    except Exception as e:
-        print(f"Error writing NDVI raster: {e}")    
+    print(f"NDVI ready in {out_ndvi_file}.")
 else:
-    print("NDVI calculation failed.")
+    print(f"NDVI calculation failed: {ndvi}")
 
 # Question 4.1 
 #  In the "calculate_ndvi", the method accepts 
@@ -120,7 +123,7 @@ else:
 #     field called mean_ndvi
 
 
-importlib.reload(l4)
+_maybe_reload(l4)
 fc = "Corvallis_parcels" # remember you should have copied this into your workspace in Block 2.
 
 #Load the fc as a smart vector layer
@@ -158,7 +161,9 @@ smart_vector.save_as("Corvallis_parcels_plusNDVI")
 #  to do.  Most of the functionality is already there
 
 
-okay, df = smart_vector.extract_to_pandas_df()
+# The attributes are also kept in a Feather file next to this script, and
+#   read from there on later runs as long as the feature class hasn't changed
+okay, df = smart_vector.to_feather_cached(f"{fc}.feather")
 
 
 # Question 6.1. 
@@ -184,7 +189,7 @@ okay, df = smart_vector.extract_to_pandas_df()
 #  below.  You can just run this -- no need to 
 #  fix or add anything. 
 
-importlib.reload(l4)
+_maybe_reload(l4)
 
 x_field = "YEAR_BUILT"
 y_field = "NDVI_mean" 
@@ -232,7 +237,7 @@ sp.scatterplot(x_field, y_field, x_min=1901, x_max = 2030)
 #      Thus, you can point to the file itself without  the full
 #      path if you want. 
 
-importlib.reload(l4)
+_maybe_reload(l4)
 
 # You have the SmartPanda as "sp" from above, right?
 #   Here, and you have the name of the file for the control file